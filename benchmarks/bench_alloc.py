@@ -0,0 +1,94 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Checks that steady-state publishes from the entities allocate nothing
+# on the heap: on/off states, integer values and availability.
+#
+# Needs gc.mem_alloc(), i.e. MicroPython (`micropython bench_alloc.py`
+# on the unix port). Exits with status 1 if any case allocates.
+# Not run on a MicroPython build yet: there is no recorded result.
+
+import sys
+sys.path.append('..')
+
+import gc
+import mha
+from mha.umqtt import MQTTClient
+
+COUNT = 100
+
+
+class NullSocket:
+    def send(self, data):
+        return len(data)
+
+    def write(self, data, n=None):
+        return len(data) if n is None else n
+
+    def setblocking(self, flag):
+        pass
+
+
+if not hasattr(gc, "mem_alloc"):
+    print("bench_alloc.py needs MicroPython (gc.mem_alloc)")
+    sys.exit(0)
+
+device = mha.HADevice("001122AABBC0")
+mqtt = mha.HAMqtt(device)
+
+client = MQTTClient(b"bench", "localhost")
+client.sock = NullSocket()
+client._write_n = True
+client.status = MQTTClient.StateConnected
+mqtt._client = client
+mqtt._current_state = MQTTClient.StateConnected
+
+binary_sensor = mha.HABinarySensor("door")
+switch = mha.HASwitch("relay")
+light = mha.HALight("lamp", mha.HALight.BrightnessFeature)
+sensor = mha.HASensor("counter")
+
+
+def binary_sensor_state(i):
+    binary_sensor.set_state(i & 1 == 0)
+
+
+def switch_state(i):
+    switch.set_state(i & 1 == 0)
+
+
+def light_brightness(i):
+    light.setBrightness(i & 0xFF)
+
+
+def sensor_value(i):
+    sensor.set_value(i)
+
+
+def availability(i):
+    binary_sensor.set_availability(i & 1 == 0)
+
+
+failed = False
+for name, run in (
+    ("binary_sensor.set_state", binary_sensor_state),
+    ("switch.set_state", switch_state),
+    ("light.setBrightness", light_brightness),
+    ("sensor.set_value", sensor_value),
+    ("set_availability", availability),
+):
+    # the first calls fill the topic caches
+    run(1)
+    run(2)
+    gc.collect()
+    gc.disable()
+    start = gc.mem_alloc()
+    for i in range(COUNT):
+        run(i)
+    allocated = gc.mem_alloc() - start
+    gc.enable()
+    failed = failed or allocated > 0
+    print("%-24s %6.1f B/call %s" % (name, allocated / COUNT, "ok" if allocated == 0 else "ALLOCATES"))
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Reports the heap held per entity: right after construction and once
+# its discovery config has been built (and cached, unless disabled).
+#
+# Runs without a broker. Uses tracemalloc on CPython and gc.mem_alloc()
+# on MicroPython.
+
+import sys
+sys.path.append('..')
+
+import gc
+import mha
+
+try:
+    import tracemalloc
+    tracemalloc.start()
+
+    def allocated():
+        return tracemalloc.get_traced_memory()[0]
+except ImportError:
+    def allocated():
+        return gc.mem_alloc()
+
+
+def measure(create):
+    gc.collect()
+    start = allocated()
+    result = create()
+    gc.collect()
+    return result, allocated() - start
+
+
+def bench(name, factory, count=50):
+    # the first instance pulls in the module, keep that out of the numbers
+    factory("%s_warmup" % name)
+    entities, created = measure(lambda: [factory("%s_%d" % (name, i)) for i in range(count)])
+    _, configured = measure(lambda: [entity.get_config() for entity in entities])
+    print(
+        "%-14s %5d B/entity, +%5d B/entity with cached config"
+        % (name, created // count, configured // count)
+    )
+    return entities
+
+
+device = mha.HADevice("001122AABBC0")
+device.set_name("MHA Memory")
+mqtt = mha.HAMqtt(device)
+
+
+def light(unique_id):
+    entity = mha.HALight(unique_id, mha.HALight.BrightnessFeature | mha.HALight.ColorTemperatureFeature)
+    entity.set_name("Light")
+    return entity
+
+
+def switch(unique_id):
+    entity = mha.HASwitch(unique_id)
+    entity.set_name("Switch")
+    return entity
+
+
+def binary_sensor(unique_id):
+    entity = mha.HABinarySensor(unique_id)
+    entity.set_name("Binary sensor")
+    return entity
+
+
+keep = [bench("light", light), bench("switch", switch), bench("binary_sensor", binary_sensor)]
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Counts socket writes and bytes on the wire per MQTTClient.publish().
+#
+# Runs without a broker: the client is attached to a socket stand-in
+# that only records what is sent. Works on CPython and MicroPython.
+
+import sys
+sys.path.append('..')
+
+import time
+from mha.umqtt import MQTTClient
+
+
+class CountingSocket:
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def send(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+        return len(data)
+
+    def write(self, data, n=None):
+        return self.send(data if n is None else data[:n])
+
+    def setblocking(self, flag):
+        pass
+
+
+def ticks_us():
+    if hasattr(time, "ticks_us"):
+        return time.ticks_us()
+    return int(time.perf_counter() * 1000000)
+
+
+def bench(name, topic, payload, count=2000):
+    client = MQTTClient(b"bench", "localhost")
+    client.sock = CountingSocket()
+    client.status = MQTTClient.StateConnected
+
+    start = ticks_us()
+    for _ in range(count):
+        client.publish(topic, payload)
+    elapsed = ticks_us() - start
+
+    print(
+        "%-16s payload %5d B: %.2f writes/publish, %d B on wire/publish, %.1f us/publish"
+        % (name, len(payload), client.sock.calls / count, client.sock.bytes // count, elapsed / count)
+    )
+
+
+bench("state", b"homeassistant/001122AABBC0/my_switch/stat_t", b"OFF")
+bench("brightness", b"homeassistant/001122AABBC0/light/bri_stat_t", b"255")
+bench("config", b"homeassistant/light/001122AABBC0/light/config", b"x" * 450)
+bench("large", b"homeassistant/001122AABBC0/camera/t", b"x" * 4096, count=200)
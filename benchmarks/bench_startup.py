@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Measures startup: time and heap for importing mha and an entity, and
+# the time from the start of the script to the first state publish
+# (config and state of a binary sensor on an already connected client).
+#
+# Runs without a broker. Start it in a fresh interpreter, e.g.
+# `python3 bench_startup.py` or `micropython bench_startup.py`. On a
+# board, freeze the package (see manifest.py) so the constant strings
+# stay in flash instead of the heap.
+
+import time
+
+if hasattr(time, "ticks_us"):
+    ticks_us = time.ticks_us
+else:
+    def ticks_us():
+        return int(time.perf_counter() * 1000000)
+
+BOOT = ticks_us()
+
+# cold boot to first publish on a board with frozen modules, in ms
+TARGET_MS = 100
+
+import sys
+sys.path.append('..')
+
+import gc
+
+try:
+    import tracemalloc
+    tracemalloc.start()
+
+    def allocated():
+        return tracemalloc.get_traced_memory()[0]
+except ImportError:
+    def allocated():
+        return gc.mem_alloc()
+
+
+class CountingSocket:
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, data):
+        self.calls += 1
+        return len(data)
+
+    def write(self, data, n=None):
+        return self.send(data if n is None else data[:n])
+
+    def setblocking(self, flag):
+        pass
+
+
+def step(name, start, heap):
+    gc.collect()
+    print("%-22s %7.2f ms %7d B" % (name, (ticks_us() - start) / 1000, allocated() - heap))
+
+
+modules = len(sys.modules)
+gc.collect()
+heap = allocated()
+start = ticks_us()
+import mha
+step("import mha", start, heap)
+
+start = ticks_us()
+HABinarySensor = mha.HABinarySensor
+step("import HABinarySensor", start, heap)
+
+start = ticks_us()
+HAMqtt = mha.HAMqtt
+HADevice = mha.HADevice
+step("import HAMqtt", start, heap)
+print("modules loaded: %d" % (len(sys.modules) - modules))
+
+from mha.umqtt import MQTTClient
+
+start = ticks_us()
+device = HADevice("001122AABBC0")
+device.set_name("MHA Startup")
+mqtt = HAMqtt(device)
+sensor = HABinarySensor("door")
+sensor.set_name("Door")
+sensor.set_current_state(True)
+
+client = MQTTClient(b"bench", "localhost")
+client.sock = CountingSocket()
+client.status = MQTTClient.StateConnected
+mqtt._client = client
+mqtt._process()
+step("first publish", start, heap)
+
+elapsed = (ticks_us() - BOOT) / 1000
+print(
+    "start to first publish: %.2f ms (target %d ms, %s), %d writes"
+    % (elapsed, TARGET_MS, "met" if elapsed <= TARGET_MS else "missed", client.sock.calls)
+)
@@ -0,0 +1,130 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# End-to-end benchmarks against the local broker stand-in (broker.py):
+#
+# - discovery: begin() until the broker has every config, for N entities
+# - publish: state updates per second and bytes on the wire per update
+# - dispatch: command latency from the broker to the entity callback,
+#   including up to 1 ms for the broker thread to pick the command up
+# - heap allocated per publish and per dispatch (MicroPython only, CPython
+#   frees most of it right away so the number would mean little)
+#
+# Run from this directory with `python3 bench_suite.py` or
+# `micropython bench_suite.py`. Compare the numbers before and after a
+# change to MQTTClient, HASerializer or the device classes.
+
+import sys
+sys.path.append('..')
+
+import gc
+import time
+import mha
+from mha.utils import constants
+from broker import Broker, ticks_us
+
+ENTITIES = 50
+PUBLISHES = 2000
+COMMANDS = 200
+
+
+def ticks_diff(end, start):
+    if hasattr(time, "ticks_diff"):
+        return time.ticks_diff(end, start)
+    return end - start
+
+
+def loop_until(mqtt, done, timeout_us=10000000):
+    start = ticks_us()
+    while not done():
+        mqtt.loop()
+        if ticks_diff(ticks_us(), start) > timeout_us:
+            raise OSError("benchmark timed out")
+
+
+def heap_allocated(run):
+    if not hasattr(gc, "mem_alloc"):
+        return None
+    gc.collect()
+    gc.disable()
+    start = gc.mem_alloc()
+    run()
+    allocated = gc.mem_alloc() - start
+    gc.enable()
+    return allocated
+
+
+def report(name, value, unit):
+    print("%-28s %10s %s" % (name, "n/a" if value is None else "%.1f" % value, unit))
+
+
+broker = Broker()
+
+device = mha.HADevice("001122AABBC0")
+device.set_name("MHA Bench")
+mqtt = mha.HAMqtt(device)
+
+commands = []
+switches = []
+for i in range(ENTITIES):
+    switch = mha.HASwitch("switch_%d" % i)
+    switch.set_name("Switch %d" % i)
+    switch.on_command(lambda sender, state: commands.append(ticks_us()))
+    switches.append(switch)
+
+
+def configs():
+    return sum(1 for _, _, topic in broker.published if topic.endswith(b"/config"))
+
+
+# discovery
+start = ticks_us()
+mqtt.begin("127.0.0.1", broker.port)
+loop_until(mqtt, lambda: configs() >= ENTITIES)
+report("discovery, %d entities" % ENTITIES, ticks_diff(ticks_us(), start) / 1000, "ms")
+report("discovery bytes on wire", broker.bytes_in, "B")
+
+# publish throughput
+switch = switches[0]
+broker.reset_counters()
+start = ticks_us()
+for i in range(PUBLISHES):
+    switch.set_state(i & 1 == 0)
+    mqtt.loop()
+loop_until(mqtt, lambda: len(broker.published) >= PUBLISHES)
+elapsed = ticks_diff(broker.published[-1][0], start)
+report("publish", PUBLISHES * 1000000 / elapsed, "msg/s")
+report("publish bytes on wire", broker.bytes_in / PUBLISHES, "B/msg")
+
+
+def publish_some():
+    for i in range(100):
+        switch.set_state(i & 1 == 0)
+
+
+allocated = heap_allocated(publish_some)
+report("publish heap", None if allocated is None else allocated / 100, "B/msg")
+
+# command dispatch latency
+topic = switch.get_data_topic(constants.HACommandTopic)
+total = 0
+for i in range(COMMANDS):
+    del commands[:]
+    start = ticks_us()
+    broker.inject(topic, b"ON" if i & 1 else b"OFF")
+    loop_until(mqtt, lambda: commands)
+    total += ticks_diff(commands[0], start)
+report("dispatch latency", total / COMMANDS, "us")
+
+
+def dispatch_some():
+    for i in range(20):
+        mqtt.process_messages(topic, b"ON")
+
+
+allocated = heap_allocated(dispatch_some)
+report("dispatch heap", None if allocated is None else allocated / 20, "B/msg")
+
+mqtt.disconnect()
+broker.stop()
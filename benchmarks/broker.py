@@ -0,0 +1,202 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Minimal MQTT 3.1.1 broker stand-in for the benchmarks.
+#
+# Serves clients on localhost from a background thread: CONNECT,
+# SUBSCRIBE/UNSUBSCRIBE (with + and # wildcards), PUBLISH at QoS 0-2,
+# retained messages, PINGREQ and DISCONNECT. It keeps count of what it
+# receives. It is not a broker: no sessions, no last will, no auth.
+# Written for CPython and the MicroPython unix port; only run on CPython
+# so far.
+
+import socket
+import select
+import struct
+import _thread
+
+try:
+    from time import ticks_us
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+
+def topic_matches(topic_filter, topic):
+    f = topic_filter.split(b"/")
+    t = topic.split(b"/")
+    for i in range(len(f)):
+        if f[i] == b"#":
+            return True
+        if i >= len(t) or (f[i] != b"+" and f[i] != t[i]):
+            return False
+    return len(f) == len(t)
+
+
+class Broker:
+    def __init__(self, port=18830):
+        self.port = port
+        self.packets_in = 0
+        self.bytes_in = 0
+        # (ticks_us, first byte, topic) of every PUBLISH received
+        self.published = []
+        self.retained = {}
+        self._clients = {}
+        self._injected = []
+        self._lock = _thread.allocate_lock()
+        self._running = True
+
+        self._server = socket.socket()
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(socket.getaddrinfo("127.0.0.1", port)[0][-1])
+        self._server.listen(4)
+        self._poll = select.poll()
+        self._poll.register(self._server, select.POLLIN)
+        # CPython's poll reports file descriptors, MicroPython's the objects
+        self._socks = {self._server.fileno(): self._server} if hasattr(self._server, "fileno") else {}
+        self._stopped = _thread.allocate_lock()
+        self._stopped.acquire()
+        _thread.start_new_thread(self._run, ())
+
+    def reset_counters(self):
+        self.packets_in = 0
+        self.bytes_in = 0
+        self.published = []
+
+    def inject(self, topic, msg, retain=False):
+        """Deliver a message to the subscribers as if a client published it."""
+        with self._lock:
+            self._injected.append((topic, msg, retain))
+
+    def stop(self):
+        self._running = False
+        self._stopped.acquire()
+        for sock in self._clients:
+            sock.close()
+        self._server.close()
+
+    def _run(self):
+        while self._running:
+            for obj, _ in self._poll.poll(1):
+                sock = self._socks.get(obj, obj)
+                if sock is self._server:
+                    client = self._server.accept()[0]
+                    self._clients[client] = [b"", []]
+                    self._poll.register(client, select.POLLIN)
+                    if hasattr(client, "fileno"):
+                        self._socks[client.fileno()] = client
+                else:
+                    self._read(sock)
+            if self._injected:
+                with self._lock:
+                    injected = self._injected
+                    self._injected = []
+                for topic, msg, retain in injected:
+                    self._deliver(topic, msg, retain)
+        self._stopped.release()
+
+    def _drop(self, sock):
+        self._poll.unregister(sock)
+        self._clients.pop(sock, None)
+        sock.close()
+
+    def _read(self, sock):
+        try:
+            data = sock.recv(4096)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(sock)
+            return
+
+        self.bytes_in += len(data)
+        client = self._clients[sock]
+        buf = client[0] + data
+        while len(buf) >= 2:
+            size = 0
+            shift = 0
+            i = 1
+            while i < len(buf):
+                size |= (buf[i] & 0x7F) << shift
+                shift += 7
+                i += 1
+                if not buf[i - 1] & 0x80:
+                    break
+            else:
+                break
+            if len(buf) < i + size:
+                break
+            self.packets_in += 1
+            self._handle(sock, client, buf[0], buf[i:i + size])
+            buf = buf[i + size:]
+        client[0] = buf
+
+    def _handle(self, sock, client, op, body):
+        kind = op & 0xF0
+        if kind == 0x10:  # CONNECT
+            sock.sendall(b"\x20\x02\x00\x00")
+        elif kind == 0x30:  # PUBLISH
+            n = struct.unpack("!H", body[:2])[0]
+            topic = bytes(body[2:2 + n])
+            i = 2 + n
+            qos = op >> 1 & 3
+            if qos:
+                pid = body[i:i + 2]
+                i += 2
+                sock.sendall((b"\x40\x02" if qos == 1 else b"\x50\x02") + pid)
+            self.published.append((ticks_us(), op, topic))
+            self._deliver(topic, bytes(body[i:]), op & 1)
+        elif kind == 0x60:  # PUBREL
+            sock.sendall(b"\x70\x02" + body[:2])
+        elif kind == 0x80:  # SUBSCRIBE
+            i = 2
+            codes = b""
+            while i < len(body):
+                n = struct.unpack("!H", body[i:i + 2])[0]
+                topic_filter = bytes(body[i + 2:i + 2 + n])
+                i += 3 + n
+                client[1].append(topic_filter)
+                codes += b"\x00"
+            sock.sendall(bytes((0x90, 2 + len(codes))) + body[:2] + codes)
+            for topic_filter in client[1][-len(codes):]:
+                for topic, msg in self.retained.items():
+                    topic_matches(topic_filter, topic) and self._send(sock, topic, msg, 1)
+        elif kind == 0xA0:  # UNSUBSCRIBE
+            i = 2
+            while i < len(body):
+                n = struct.unpack("!H", body[i:i + 2])[0]
+                topic_filter = bytes(body[i + 2:i + 2 + n])
+                i += 2 + n
+                topic_filter in client[1] and client[1].remove(topic_filter)
+            sock.sendall(b"\xb0\x02" + body[:2])
+        elif kind == 0xC0:  # PINGREQ
+            sock.sendall(b"\xd0\x00")
+        elif kind == 0xE0:  # DISCONNECT
+            self._drop(sock)
+
+    def _deliver(self, topic, msg, retain):
+        if retain:
+            if msg:
+                self.retained[topic] = msg
+            else:
+                self.retained.pop(topic, None)
+        for sock, client in self._clients.items():
+            for topic_filter in client[1]:
+                if topic_matches(topic_filter, topic):
+                    self._send(sock, topic, msg, 0)
+                    break
+
+    def _send(self, sock, topic, msg, retain):
+        size = 2 + len(topic) + len(msg)
+        header = bytearray((0x30 | retain,))
+        while size > 0x7F:
+            header.append(size & 0x7F | 0x80)
+            size >>= 7
+        header.append(size)
+        try:
+            sock.sendall(bytes(header) + struct.pack("!H", len(topic)) + topic + msg)
+        except OSError:
+            pass
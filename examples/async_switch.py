@@ -0,0 +1,45 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import sys
+sys.path.append('..')
+
+import mha
+import asyncio
+# import machine
+# import binascii
+
+BROKER_ADDR = "192.168.2.2"
+
+device = mha.HADevice("001122AABBC3")  # (binascii.hexlify(machine.unique_id()).decode('utf-8'))
+mqtt = mha.HAMqttAsync(device)
+
+device.set_name("MHA Async Switch")
+device.set_software_version("0.1.0")
+
+switch = mha.HASwitch("my_switch")
+
+switch.set_current_state(True)
+switch.set_name("My Switch")
+switch.set_icon("mdi:lightbulb")
+
+def on_switch_command(sender: mha.HASwitch, state: bool):
+    print("Switch state:", state)
+    sender.set_state(state)
+    # to some action here
+
+switch.on_command(on_switch_command)
+
+mqtt.begin(BROKER_ADDR)
+
+async def toggle():
+    while True:
+        await asyncio.sleep(5)
+        switch.set_state(not switch.get_current_state())
+
+async def main():
+    asyncio.create_task(mqtt.run())
+    await toggle()
+
+asyncio.run(main())
@@ -0,0 +1,39 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import sys
+sys.path.append('..')
+
+import os
+import mha
+import time
+from mha.utils import constants
+# import machine
+# import binascii
+
+BROKER_ADDR = "192.168.2.2"
+IMAGE = "snapshot.jpg"
+
+device = mha.HADevice("001122AABBC0")  # (binascii.hexlify(machine.unique_id()).decode('utf-8'))
+mqtt = mha.HAMqtt(device)
+
+device.set_name("MHA Camera")
+device.set_software_version("0.1.0")
+
+camera = mha.HACamera("my_camera")
+camera.set_name("Snapshot")
+camera.set_encoding(constants.HAEncodingBase64)
+
+mqtt.begin(BROKER_ADDR)
+
+last_time = time.time()
+
+while True:
+    mqtt.loop()
+
+    if time.time() - last_time > 30:
+        # the file is streamed a write buffer at a time, never loaded whole
+        with open(IMAGE, "rb") as f:
+            camera.publish_image(f, os.stat(IMAGE)[6])
+        last_time = time.time()
@@ -0,0 +1,41 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import sys
+sys.path.append('..')
+
+import mha
+from mha.utils import constants
+import machine
+# import binascii
+
+BROKER_ADDR = "192.168.2.2"
+
+device = mha.HADevice("001122AABBC0")  # (binascii.hexlify(machine.unique_id()).decode('utf-8'))
+mqtt = mha.HAMqtt(device)
+
+device.set_name("MHA Device Trigger")
+device.set_software_version("0.1.0")
+
+press = mha.HADeviceTrigger(constants.HAButtonShortPressType, constants.HAButton1Subtype)
+release = mha.HADeviceTrigger(constants.HAButtonShortReleaseType, constants.HAButton1Subtype)
+
+button = machine.Pin(0, machine.Pin.IN, machine.Pin.PULL_UP)
+
+
+# runs in the interrupt handler: trigger() only queues the event,
+# mqtt.loop() publishes it
+def on_button(pin):
+    if pin.value():
+        release.trigger()
+    else:
+        press.trigger()
+
+
+button.irq(on_button, machine.Pin.IRQ_FALLING | machine.Pin.IRQ_RISING, hard=True)
+
+mqtt.begin(BROKER_ADDR)
+
+while True:
+    mqtt.loop()
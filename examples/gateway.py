@@ -0,0 +1,46 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import sys
+sys.path.append('..')
+
+import mha
+import time
+
+BROKER_ADDR = "192.168.2.2"
+
+# the gateway owns the connection and its last will
+gateway = mha.HADevice("001122AABBC4")
+gateway.set_name("MHA Gateway")
+gateway.enable_shared_availability()
+mqtt = mha.HAMqtt(gateway)
+gateway.enable_last_will()
+mqtt.enable_wildcard_subscription()
+
+relays = []
+
+# every node behind the gateway shows up as its own device in Home Assistant;
+# its entities are announced with both availability topics, so the
+# gateway's last will marks the nodes offline too
+for address in range(1, 9):
+    node = mha.HADevice("rs485_node_%d" % address)
+    node.set_name("Relay node %d" % address)
+    node.enable_shared_availability()
+
+    relay = mha.HASwitch("relay")
+    relay.set_device(node)
+    relay.set_name("Relay")
+
+    def on_relay_command(sender: mha.HASwitch, state: bool):
+        # write the coil on the bus here
+        sender.set_state(state)
+
+    relay.on_command(on_relay_command)
+    relays.append(relay)
+
+mqtt.begin(BROKER_ADDR)
+
+while True:
+    mqtt.loop()
+    time.sleep(0.01)
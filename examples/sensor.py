@@ -0,0 +1,35 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import sys
+sys.path.append('..')
+
+import mha
+import time
+# import machine
+# import binascii
+
+BROKER_ADDR = "192.168.2.2"
+
+device = mha.HADevice("001122AABBC0")  # (binascii.hexlify(machine.unique_id()).decode('utf-8'))
+mqtt = mha.HAMqtt(device)
+
+device.set_name("MHA Sensor")
+device.set_software_version("0.1.0")
+
+sensor = mha.HASensor("my_sensor")
+
+sensor.set_name("Vibration")
+sensor.set_state_class("measurement")
+sensor.set_unit_of_measurement("g")
+# sample at 100 Hz, publish every 5 s or when the level jumps by 0.5 g
+sensor.enable_aggregation(size=128, interval=5000, deadband=0.5)
+
+mqtt.begin(BROKER_ADDR)
+
+while True:
+    mqtt.loop()
+
+    sensor.add_sample(time.time() % 1)  # (adc.read_u16() / 65535)
+    time.sleep_ms(10) if hasattr(time, "sleep_ms") else time.sleep(0.01)
@@ -0,0 +1,11 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Freeze mha into a MicroPython firmware image, e.g.
+#   make BOARD=ESP32_GENERIC FROZEN_MANIFEST=/path/to/manifest.py
+# Frozen bytecode and its constant strings are executed from flash, so
+# importing the library costs almost no heap.
+
+include("$(PORT_DIR)/boards/manifest.py")
+package("mha", opt=3)
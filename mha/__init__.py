@@ -5,9 +5,13 @@
 _attrs = {
     "HADevice": "ha_device",
     "HAMqtt": "ha_mqtt",
+    "HAMqttAsync": "ha_mqtt_async",
     "HABaseDeviceType": "devices.basic_device",
     "HABinarySensor": "devices.binary_sensor",
+    "HACamera": "devices.camera",
+    "HADeviceTrigger": "devices.device_trigger",
     "HALight": "devices.light",
+    "HASensor": "devices.sensor",
     "HASwitch": "devices.switch",
 }
 
@@ -3,9 +3,12 @@
 # SPDX-License-Identifier: MIT
 
 from ..ha_mqtt import HAMqtt
-from ..utils.serializer import HASerializer
+from ..utils.serializer import HASerializer, SerializerBuffer, SerializerCrc, SerializerSizeCounter
 from ..utils import constants
-import json
+
+# integers are formatted here; a view per length avoids slicing on publish
+_number = bytearray(12)
+_number_views = tuple(memoryview(_number)[:i] for i in range(len(_number) + 1))
 
 
 class HABaseDeviceType:
@@ -13,6 +16,18 @@ class HABaseDeviceType:
     AvailabilityOnline = 1
     AvailabilityOffline = 2
 
+    # pre-encoded payloads, publishing them does not allocate
+    PayloadOn = constants.HAStateOn.encode("utf-8")
+    PayloadOff = constants.HAStateOff.encode("utf-8")
+    PayloadOnline = constants.HAOnline.encode("utf-8")
+    PayloadOffline = constants.HAOffline.encode("utf-8")
+
+    __slots__ = (
+        "component_name", "unique_id", "_name", "_object_id", "_serializer",
+        "_availability", "_device", "_topics", "_config", "_config_published",
+        "_attributes", "_attributes_changed",
+    )
+
     def __init__(self, component_name, unique_id) -> None:
         self.component_name = component_name
         self.unique_id = unique_id
@@ -20,6 +35,12 @@ class HABaseDeviceType:
         self._object_id = None
         self._serializer = None
         self._availability = self.AvailabilityDefault
+        self._device = None
+        self._topics = {}
+        self._config = None
+        self._config_published = False
+        self._attributes = None
+        self._attributes_changed = False
 
         self.mqtt() and self.mqtt().add_device_type(self)
 
@@ -31,12 +52,14 @@ class HABaseDeviceType:
 
     def set_name(self, name):
         self._name = name
+        self.invalidate_config()
 
     def get_name(self):
         return self._name
 
     def set_object_id(self, object_id):
         self._object_id = object_id
+        self.invalidate_config()
 
     def get_object_id(self):
         return self._object_id
@@ -45,15 +68,74 @@ class HABaseDeviceType:
         return self._serializer
 
     def set_availability(self, online):
+        # the availability topic only becomes part of the config once configured
+        self.is_availability_configured() or self.invalidate_config()
         self._availability = self.AvailabilityOnline if online else self.AvailabilityOffline
         self.publish_availability()
 
     def mqtt(self):
         return HAMqtt.instance()
 
-    def subscribe_topic(self, unique_id, topic):
-        full_topic = HASerializer.generate_data_topic(unique_id, topic).encode("utf-8")
-        HAMqtt.instance().subscribe(full_topic)
+    def set_device(self, device):
+        """Attach the entity to `device` instead of the device HAMqtt was created with."""
+        self._device = device
+        mqtt = self.mqtt()
+        mqtt is not None and mqtt.add_device(device)
+        self.invalidate_topics()
+
+    def get_device(self):
+        if self._device is not None:
+            return self._device
+        mqtt = self.mqtt()
+        return mqtt.device if mqtt is not None else None
+
+    def get_data_topic(self, topic):
+        full_topic = self._topics.get(topic)
+        if full_topic is None:
+            full_topic = HASerializer.generate_data_topic(self.unique_id, topic, self._device)
+            if full_topic is None:
+                return None
+            full_topic = self._topics[topic] = full_topic.encode("utf-8")
+        return full_topic
+
+    def get_config_topic(self):
+        full_topic = self._topics.get(constants.HAConfigTopic)
+        if full_topic is None:
+            full_topic = HASerializer.generate_config_topic(self.component_name, self.unique_id, self._device)
+            if full_topic is None:
+                return None
+            full_topic = self._topics[constants.HAConfigTopic] = full_topic.encode("utf-8")
+        return full_topic
+
+    def invalidate_topics(self):
+        self._topics = {}
+        self.invalidate_config()
+
+    def invalidate_config(self):
+        self._serializer = None
+        self._config = None
+        # announced configs are republished once, however many setters run
+        if not self._config_published:
+            return
+
+        self._config_published = False
+        mqtt = self.mqtt()
+        mqtt is not None and mqtt.schedule_config(self)
+        self._config = None
+
+    def subscribe_topic(self, unique_id, topic, handler=None):
+        if unique_id == self.unique_id:
+            full_topic = self.get_data_topic(topic)
+        else:
+            full_topic = HASerializer.generate_data_topic(unique_id, topic, self._device).encode("utf-8")
+        mqtt = HAMqtt.instance()
+        if handler is not None:
+            mqtt.add_route(full_topic, self, handler)
+            # <data_prefix>/<device_id>/+/<topic> already covers this entity
+            if unique_id == self.unique_id and mqtt.is_wildcard_subscription_enabled():
+                return mqtt.subscribe(mqtt.get_wildcard_topic(topic, self._device))
+
+        return mqtt.subscribe(full_topic)
 
     def on_message(self, topic, payload):
         pass
@@ -61,27 +143,87 @@ class HABaseDeviceType:
     def build_serializer(self):
         raise NotImplementedError
 
+    def _build_serializer(self):
+        self.build_serializer()
+        if self._serializer is not None and self._attributes is not None:
+            self._serializer.set_kv(
+                constants.HAJsonAttributesTopic, self.get_data_topic(constants.HAJsonAttributesTopic)
+            )
+
     def destroy_serializer(self):
-        if self._serializer is not None:
-            del self._serializer
+        self._serializer = None
 
-    def publish_config(self):
-        self.build_serializer()
+    def get_config(self):
+        if self._config is None:
+            self._build_serializer()
+
+            if self._serializer is None:
+                return None
+
+            size = self._serializer.calculate_size()
+            if size == 0:
+                return None
+
+            config = bytearray(size)
+            self._serializer.flush(SerializerBuffer(config))
+            self._config = config
+            self.destroy_serializer()
+        return self._config
 
+    def get_config_crc(self):
+        """CRC-32 of the discovery config, None if there is no config."""
+        from binascii import crc32
+
+        if self._config is not None or self.mqtt().is_config_cache_enabled():
+            config = self.get_config()
+            return None if config is None else crc32(config)
+
+        self._build_serializer()
         if self._serializer is None:
+            return None
+
+        out = SerializerCrc()
+        ok = self._serializer.flush(out)
+        self.destroy_serializer()
+        return out.crc if ok else None
+
+    # Called with the retained config found on the broker. Returns True
+    # if it matches, so the config does not have to be published again.
+    def check_config(self, payload):
+        from binascii import crc32
+
+        self._config_published = len(payload) > 0 and crc32(payload) == self.get_config_crc()
+        return self._config_published
+
+    def publish_config(self):
+        topic = self.get_config_topic()
+        mqtt = self.mqtt()
+        if topic is None:
             return
 
-        topic = HASerializer.generate_config_topic(self.component_name, self.unique_id).encode(
-            "utf-8"
-        )
-        payload = json.dumps(self._serializer.flush()).encode("utf-8")
+        # compared with the retained copy on the broker first
+        if mqtt.defer_config(self, topic):
+            return
+
+        if self._config is None and not mqtt.is_config_cache_enabled():
+            # stream straight into the socket, the payload is never held in RAM
+            self._build_serializer()
+            if self._serializer is None:
+                return
+
+            size = self._serializer.calculate_size()
+            self._config_published = size > 0 and mqtt.publish_stream(topic, size, self._serializer.flush, True)
+            self.destroy_serializer()
+            return
+
+        payload = self.get_config()
         # print("MHA publish_config topic: ", topic)
         # print("MHA publish_config payload: ", payload)
-        if topic is not None:
-            self.mqtt().publish(topic, payload, True)
+        if payload is not None:
+            self._config_published = mqtt.publish(topic, payload, True)
 
     def publish_availability(self):
-        device = self.mqtt().device
+        device = self.get_device()
         if (
             device is None
             or device.is_shared_availability_enabled()
@@ -90,12 +232,79 @@ class HABaseDeviceType:
             return
 
         self.publish_on_data_topic(
-            constants.HAAvailabilityTopic, constants.HAOnline if self._availability else constants.HAOffline, True
+            constants.HAAvailabilityTopic, self.PayloadOnline if self.is_online() else self.PayloadOffline, True
         )
 
+    def enable_json_attributes(self):
+        """Announce a json_attr_t topic for the attributes staged with set_attribute()."""
+        if self._attributes is None:
+            self._attributes = {}
+            self.invalidate_config()
+
+    def is_json_attributes_enabled(self):
+        return self._attributes is not None
+
+    def set_attribute(self, name, value):
+        """Stage an attribute, it is sent with the others by publish_attributes()."""
+        attributes = self._attributes
+        if attributes is None:
+            self.enable_json_attributes()
+            attributes = self._attributes
+        if name not in attributes or attributes[name] != value:
+            attributes[name] = value
+            self._attributes_changed = True
+
+    def get_attribute(self, name):
+        return None if self._attributes is None else self._attributes.get(name)
+
+    def publish_attributes(self, force=False):
+        """Send every staged attribute as one JSON message if any has changed."""
+        attributes = self._attributes
+        if not attributes or not (force or self._attributes_changed):
+            return True
+
+        counter = SerializerSizeCounter()
+        HASerializer.flush_value(counter, attributes)
+        payload = bytearray(counter.size)
+        HASerializer.flush_value(SerializerBuffer(payload), attributes)
+        if not self.publish_on_data_topic(constants.HAJsonAttributesTopic, payload):
+            return False
+
+        self._attributes_changed = False
+        return True
+
     def publish_on_data_topic(self, topic, payload, retained=False):
-        full_topic = HASerializer.generate_data_topic(self.unique_id, topic).encode("utf-8")
+        full_topic = self.get_data_topic(topic)
         if full_topic is None:
             return False
 
-        return self.mqtt().publish(full_topic, payload.encode("utf-8"), retain=retained)
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        return self.mqtt().publish(full_topic, payload, retained)
+
+    def publish_number_on_data_topic(self, topic, value, retained=False):
+        """Integers are formatted into a shared buffer instead of a new string."""
+        if isinstance(value, bool) or not isinstance(value, int) or not -99999999999 <= value <= 999999999999:
+            return self.publish_on_data_topic(topic, str(value), retained)
+
+        buf = _number
+        n = 0
+        if value < 0:
+            buf[0] = 0x2D  # -
+            value = -value
+            n = 1
+        start = n
+        while True:
+            buf[n] = 0x30 + value % 10
+            value //= 10
+            n += 1
+            if value == 0:
+                break
+        # digits were written least significant first
+        i = start
+        j = n - 1
+        while i < j:
+            buf[i], buf[j] = buf[j], buf[i]
+            i += 1
+            j -= 1
+        return self.publish_on_data_topic(topic, _number_views[n], retained)
@@ -8,6 +8,9 @@ from ..utils import constants
 
 
 class HABinarySensor(HABaseDeviceType):
+
+    __slots__ = ("_class", "_icon", "_expire_after", "_current_state")
+
     def __init__(self, unique_id) -> None:
         super().__init__(constants.HAComponentBinarySensor, unique_id)
         self._class = None
@@ -30,6 +33,7 @@ class HABinarySensor(HABaseDeviceType):
             self._expire_after = expire_after
         else:
             self._expire_after = 0
+        self.invalidate_config()
 
     def set_current_state(self, state: bool) -> None:
         self._current_state = state
@@ -39,9 +43,11 @@ class HABinarySensor(HABaseDeviceType):
 
     def set_device_class(self, class_name: str) -> None:
         self._class = class_name
+        self.invalidate_config()
 
     def set_icon(self, icon: str) -> None:
         self._icon = icon
+        self.invalidate_config()
 
     def build_serializer(self):
         if self._serializer is not None or self.unique_id is None:
@@ -53,6 +59,7 @@ class HABinarySensor(HABaseDeviceType):
         self._serializer.set_flag(HASerializer.WithUniqueId)
         self._serializer.set_kv(constants.HADeviceClassProperty, self._class)
         self._serializer.set_kv(constants.HAIconProperty, self._icon)
+        self._expire_after and self._serializer.set_kv(constants.HAExpireAfterProperty, self._expire_after)
 
         self._serializer.set_flag(HASerializer.WithDevice)
         self._serializer.set_flag(HASerializer.WithAvailability)
@@ -69,4 +76,4 @@ class HABinarySensor(HABaseDeviceType):
         self._publish_state(self._current_state)
 
     def _publish_state(self, state) -> bool:
-        return self.publish_on_data_topic(constants.HAStateTopic, constants.HAStateOn if state else constants.HAStateOff)
+        return self.publish_on_data_topic(constants.HAStateTopic, self.PayloadOn if state else self.PayloadOff)
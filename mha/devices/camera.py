@@ -0,0 +1,67 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+from .basic_device import HABaseDeviceType
+from ..utils.serializer import HASerializer
+from ..utils import constants
+
+
+class HACamera(HABaseDeviceType):
+
+    __slots__ = ("_encoding", "_icon")
+
+    def __init__(self, unique_id) -> None:
+        super().__init__(constants.HAComponentCamera, unique_id)
+        self._encoding = None
+        self._icon = None
+
+    def publish_image(self, source, size=None) -> bool:
+        """Publish an image without holding it in memory.
+
+        `source` is bytes-like, a file opened in binary mode or an iterable
+        of chunks (e.g. a generator refilling one memoryview). `size` is
+        the image length in bytes, required unless `source` is bytes-like.
+        """
+        topic = self.get_data_topic(constants.HATopic)
+        if topic is None:
+            return False
+
+        if size is None:
+            size = len(source)
+        return self.mqtt().publish_from(
+            topic, source, size, False, 0, self._encoding == constants.HAEncodingBase64
+        )
+
+    def set_encoding(self, encoding: str) -> None:
+        """None for raw bytes, or constants.HAEncodingBase64."""
+        self._encoding = encoding
+        self.invalidate_config()
+
+    def set_icon(self, icon: str) -> None:
+        self._icon = icon
+        self.invalidate_config()
+
+    def build_serializer(self):
+        if self._serializer is not None or self.unique_id is None:
+            return
+
+        self._serializer = HASerializer(self)
+        self._serializer.set_kv(constants.HANameProperty, self._name)
+        self._serializer.set_kv(constants.HAObjectIdProperty, self._object_id)
+        self._serializer.set_flag(HASerializer.WithUniqueId)
+        self._serializer.set_kv(constants.HAIconProperty, self._icon)
+        self._serializer.set_kv(constants.HAImageEncodingProperty, self._encoding)
+
+        self._serializer.set_flag(HASerializer.WithDevice)
+        self._serializer.set_flag(HASerializer.WithAvailability)
+        self._serializer.set_topic(constants.HATopic)
+
+    def on_mqtt_connected(self):
+        if self.unique_id is None:
+            return
+
+        print("MHA: HACamera on_mqtt_connected")
+
+        self.publish_config()
+        self.publish_availability()
@@ -0,0 +1,56 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+from .basic_device import HABaseDeviceType
+from ..utils.serializer import HASerializer
+from ..utils import constants
+
+
+class HADeviceTrigger(HABaseDeviceType):
+    """Device trigger, e.g. a button press, for Home Assistant automations.
+
+    `trigger()` does not touch the network: it records the event in a ring
+    shared by all triggers and HAMqtt.loop() publishes the events in the
+    order they happened. It does not allocate, so it can be the handler of
+    a pin IRQ, e.g. `pin.irq(trigger.trigger, machine.Pin.IRQ_FALLING)`.
+    """
+
+    __slots__ = ("_type", "_subtype", "_index", "_events")
+
+    def __init__(self, type, subtype) -> None:
+        super().__init__(constants.HAComponentDeviceAutomation, "%s_%s" % (type, subtype))
+        self._type = type
+        self._subtype = subtype
+        mqtt = self.mqtt()
+        self._index = mqtt.add_trigger(self)
+        self._events = mqtt.get_trigger_events()
+
+    def get_type(self):
+        return self._type
+
+    def get_subtype(self):
+        return self._subtype
+
+    def trigger(self, _=None) -> bool:
+        """Queue the event. Returns False if the ring is full (counted, not blocking)."""
+        return self._events.put(self._index)
+
+    def build_serializer(self):
+        if self._serializer is not None or self.unique_id is None:
+            return
+
+        self._serializer = HASerializer(self)
+        self._serializer.set_kv(constants.HAAutomationTypeProperty, constants.HATrigger)
+        self._serializer.set_topic(constants.HATopic)
+        self._serializer.set_kv(constants.HATypeProperty, self._type)
+        self._serializer.set_kv(constants.HASubtypeProperty, self._subtype)
+        self._serializer.set_flag(HASerializer.WithDevice)
+
+    def on_mqtt_connected(self):
+        if self.unique_id is None:
+            return
+
+        print("MHA: HADeviceTrigger on_mqtt_connected")
+
+        self.publish_config()
@@ -14,6 +14,14 @@ class HALight(HABaseDeviceType):
     ColorTemperatureFeature = 2
     RGBColorFeature = 4
 
+    __slots__ = (
+        "_features", "_icon", "_retain", "_optimistic", "_brightness_scale",
+        "_current_state", "_current_brightness", "_min_mireds", "_max_mireds",
+        "_current_color_temperature", "_current_rgb_color", "_state_callback",
+        "_brightness_callback", "_color_temperature_callback", "_rgb_color_callback",
+        "_json_schema", "_color_mode", "_transition_callback", "_json_held",
+    )
+
     def __init__(self, unique_id: str, features: int = DefaultFeatures):
         super().__init__(constants.HAComponentLight, unique_id)
         self._features = features
@@ -31,6 +39,28 @@ class HALight(HABaseDeviceType):
         self._brightness_callback = None
         self._color_temperature_callback = None
         self._rgb_color_callback = None
+        self._json_schema = False
+        self._color_mode = None
+        self._transition_callback = None
+        # not None while a JSON command is dispatched, True once a state was set
+        self._json_held = None
+
+    def set_values(self, state=None, brightness=None, color_temperature=None, rgb_color=None) -> bool:
+        """Change several values at once, published as one message with the JSON schema."""
+        if not self._json_schema:
+            ok = state is None or self.set_state(state)
+            ok = (brightness is None or self.setBrightness(brightness)) and ok
+            ok = (color_temperature is None or self.set_color_temperature(color_temperature)) and ok
+            return (rgb_color is None or self.set_rgb_color(rgb_color)) and ok
+
+        if not self._publish_json_state(state, brightness, color_temperature, rgb_color):
+            return False
+
+        state is None or self.set_current_state(state)
+        brightness is None or self.set_current_brightness(brightness)
+        color_temperature is None or self.set_current_color_temperature(color_temperature)
+        rgb_color is None or self.set_current_rgbcolor(rgb_color)
+        return True
 
     def set_state(self, state: bool, force: bool = False) -> bool:
         if force is False and state == self._current_state:
@@ -104,18 +134,23 @@ class HALight(HABaseDeviceType):
 
     def set_icon(self, icon: str) -> None:
         self._icon = icon
+        self.invalidate_config()
 
     def set_retain(self, retain: bool) -> None:
         self._retain = retain
+        self.invalidate_config()
 
     def set_optimistic(self, optimistic: bool) -> None:
         self._optimistic = optimistic
+        self.invalidate_config()
 
     def set_min_mireds(self, mireds: int) -> None:
         self._min_mireds = mireds
+        self.invalidate_config()
 
     def set_max_mireds(self, mireds: int) -> None:
         self._max_mireds = mireds
+        self.invalidate_config()
 
     def on_state_command(self, callback) -> None:
         self._state_callback = callback
@@ -129,6 +164,27 @@ class HALight(HABaseDeviceType):
     def on_rgb_color_command(self, callback) -> None:
         self._rgb_color_callback = callback
 
+    def on_transition_command(self, callback) -> None:
+        """JSON schema only: `callback(sender, seconds)` runs before the other command callbacks."""
+        self._transition_callback = callback
+
+    def enable_json_schema(self) -> None:
+        """Use one JSON command topic and one JSON state message instead of a topic per value."""
+        self._json_schema = True
+        # every state message carries the mode, also before a color is set
+        if self._features & self.RGBColorFeature:
+            self._color_mode = constants.HAColorModeRGB
+        elif self._features & self.ColorTemperatureFeature:
+            self._color_mode = constants.HAColorModeColorTemp
+        elif self._features & self.BrightnessFeature:
+            self._color_mode = constants.HAColorModeBrightness
+        else:
+            self._color_mode = constants.HAColorModeOnOff
+        self.invalidate_config()
+
+    def is_json_schema_enabled(self) -> bool:
+        return self._json_schema
+
     def build_serializer(self) -> None:
         if self._serializer or self.unique_id is None:
             return
@@ -142,12 +198,37 @@ class HALight(HABaseDeviceType):
         self._retain and self._serializer.set_kv(constants.HARetainProperty, self._retain)
         self._optimistic and self._serializer.set_kv(constants.HAOptimisticProperty, self._optimistic)
 
+        if self._json_schema:
+            self._build_json_schema()
+        else:
+            self._build_default_schema()
+
+        self._serializer.set_flag(HASerializer.WithDevice)
+        self._serializer.set_flag(HASerializer.WithAvailability)
+        self._serializer.set_topic(constants.HAStateTopic)
+        self._serializer.set_topic(constants.HACommandTopic)
+
+    def _build_json_schema(self) -> None:
+        self._serializer.set_kv(constants.HASchemaProperty, constants.HASchemaJson)
+
+        modes = []
+        self._features & self.ColorTemperatureFeature and modes.append(constants.HAColorModeColorTemp)
+        self._features & self.RGBColorFeature and modes.append(constants.HAColorModeRGB)
+        if not modes:
+            modes.append(constants.HAColorModeBrightness if self._features & self.BrightnessFeature else constants.HAColorModeOnOff)
+        self._serializer.set_kv(constants.HASupportedColorModesProperty, modes)
+
+        self._brightness_scale and self._serializer.set_kv(constants.HABrightnessScaleProperty, self._brightness_scale)
+        self._min_mireds and self._serializer.set_kv(constants.HAMinMiredsProperty, self._min_mireds)
+        self._max_mireds and self._serializer.set_kv(constants.HAMaxMiredsProperty, self._max_mireds)
+
+    def _build_default_schema(self) -> None:
         if self._features & self.BrightnessFeature:
             self._serializer.set_topic(constants.HABrightnessStateTopic)
             self._serializer.set_topic(constants.HABrightnessCommandTopic)
 
             if self._brightness_scale:
-                self._serializer.set_kv(constants.HABrightnessScaleProperty, self._brightnessScale)
+                self._serializer.set_kv(constants.HABrightnessScaleProperty, self._brightness_scale)
 
         if self._features & self.ColorTemperatureFeature:
             self._serializer.set_topic(constants.HAColorTemperatureStateTopic)
@@ -163,11 +244,6 @@ class HALight(HABaseDeviceType):
             self._serializer.set_topic(constants.HARGBCommandTopic)
             self._serializer.set_topic(constants.HARGBStateTopic)
 
-        self._serializer.set_flag(HASerializer.WithDevice)
-        self._serializer.set_flag(HASerializer.WithAvailability)
-        self._serializer.set_topic(constants.HAStateTopic)
-        self._serializer.set_topic(constants.HACommandTopic)
-
     def on_mqtt_connected(self) -> None:
         if self.unique_id is None:
             return
@@ -175,69 +251,87 @@ class HALight(HABaseDeviceType):
         self.publish_config()
         self.publish_availability()
 
+        if self._json_schema:
+            self._retain and self._publish_json_state()
+            self.subscribe_topic(self.unique_id, constants.HACommandTopic, self._handle_json_command)
+            return
+
         if self._retain:
-            self._publish_state()
-            self._publish_brightness()
-            self._publish_color_temperature()
-            self._publish_rgb_color()
-
-        self.subscribe_topic(self.unique_id, constants.HACommandTopic)
-
-        self._features & self.BrightnessFeature and self.subscribe_topic(self.unique_id, constants.HABrightnessCommandTopic)
-        self._features & self.ColorTemperatureFeature and self.subscribe_topic(self.unique_id, constants.HAColorTemperatureCommandTopic)
-        self._features & self.RGBColorFeature and self.subscribe_topic(self.unique_id, constants.HARGBCommandTopic)
-
-    def on_message(self, topic, payload):
-        if self._serializer.compare_data_topics(
-            topic,
-            self.unique_id,
-            constants.HACommandTopic
-        ):
-            self._handle_state_command(payload)
-
-        if self._serializer.compare_data_topics(
-            topic,
-            self.unique_id,
-            constants.HABrightnessCommandTopic
-        ):
-            self._handle_brightness_command(payload)
-
-        if self._serializer.compare_data_topics(
-            topic,
-            self.unique_id,
-            constants.HAColorTemperatureCommandTopic
-        ):
-            self._handle_color_temperature_command(payload)
-
-        if self._serializer.compare_data_topics(
-            topic,
-            self.unique_id,
-            constants.HARGBCommandTopic
-        ):
-            print("RGB color command, payload: ", payload)
-            self._handle_rgb_color_command(payload)
+            self._publish_state(self._current_state)
+            self._publish_brightness(self._current_brightness)
+            self._publish_color_temperature(self._current_color_temperature)
+            self._current_rgb_color is not None and self._publish_rgb_color(self._current_rgb_color)
+
+        self.subscribe_topic(self.unique_id, constants.HACommandTopic, self._handle_state_command)
+
+        self._features & self.BrightnessFeature and self.subscribe_topic(self.unique_id, constants.HABrightnessCommandTopic, self._handle_brightness_command)
+        self._features & self.ColorTemperatureFeature and self.subscribe_topic(self.unique_id, constants.HAColorTemperatureCommandTopic, self._handle_color_temperature_command)
+        self._features & self.RGBColorFeature and self.subscribe_topic(self.unique_id, constants.HARGBCommandTopic, self._handle_rgb_color_command)
+
+    # The whole state as one JSON message; values not given are the current ones.
+    def _publish_json_state(self, state=None, brightness=None, color_temperature=None, rgb_color=None) -> bool:
+        if rgb_color is not None:
+            self._color_mode = constants.HAColorModeRGB
+        elif color_temperature is not None:
+            self._color_mode = constants.HAColorModeColorTemp
+
+        if self._json_held is not None:
+            # sent once with every change after the command's callbacks
+            self._json_held = True
+            return True
+
+        state = self._current_state if state is None else state
+        parts = ['{"state":"%s"' % (constants.HAStateOn if state else constants.HAStateOff)]
+        if self._features & self.BrightnessFeature:
+            parts.append(',"brightness":%d' % (self._current_brightness if brightness is None else brightness))
+        if self._features & self.ColorTemperatureFeature:
+            temperature = self._current_color_temperature if color_temperature is None else color_temperature
+            temperature and parts.append(',"color_temp":%d' % temperature)
+        if self._features & self.RGBColorFeature:
+            color = self._current_rgb_color if rgb_color is None else rgb_color
+            if color is not None:
+                if isinstance(color, (str, bytes)):
+                    color = [int(c) for c in (color if isinstance(color, str) else color.decode()).split(",")]
+                parts.append(',"color":{"r":%d,"g":%d,"b":%d}' % tuple(color))
+        self._color_mode is not None and parts.append(',"color_mode":"%s"' % self._color_mode)
+        parts.append("}")
+        return self.publish_on_data_topic(constants.HAStateTopic, "".join(parts))
 
     def _publish_state(self, state: bool) -> bool:
-        return self.publish_on_data_topic(constants.HAStateTopic, constants.HAStateOn if state else constants.HAStateOff)
+        if self._json_schema:
+            return self._publish_json_state(state)
+
+        return self.publish_on_data_topic(constants.HAStateTopic, self.PayloadOn if state else self.PayloadOff)
 
     def _publish_brightness(self, brightness: int) -> bool:
-        if self._features & self.BrightnessFeature:
-            self.publish_on_data_topic(constants.HABrightnessStateTopic, str(brightness))
-        else:
+        if not self._features & self.BrightnessFeature:
             return False
 
-    def _publish_color_temperature(self, temperature: int) -> None:
-        if self._features & self.ColorTemperatureFeature:
-            self.publish_on_data_topic(constants.HAColorTemperatureStateTopic, str(temperature))
-        else:
+        if self._json_schema:
+            return self._publish_json_state(None, brightness)
+
+        return self.publish_number_on_data_topic(constants.HABrightnessStateTopic, brightness)
+
+    def _publish_color_temperature(self, temperature: int) -> bool:
+        if not self._features & self.ColorTemperatureFeature:
             return False
 
-    def _publish_rgb_color(self, color) -> None:
-        if self._features & self.RGBColorFeature:
-            self.publish_on_data_topic(constants.HARGBCommandTopic, color)
-        else:
+        if self._json_schema:
+            return self._publish_json_state(None, None, temperature)
+
+        return self.publish_number_on_data_topic(constants.HAColorTemperatureStateTopic, temperature)
+
+    def _publish_rgb_color(self, color) -> bool:
+        if not self._features & self.RGBColorFeature:
             return False
 
+        if self._json_schema:
+            return self._publish_json_state(None, None, None, color)
+
+        if not isinstance(color, (str, bytes)):
+            color = "%d,%d,%d" % tuple(color)
+        return self.publish_on_data_topic(constants.HARGBStateTopic, color)
+
     def _handle_state_command(self, payload: str) -> None:
         state = len(payload) == len(constants.HAStateOn)
         self._state_callback and self._state_callback(self, state)
@@ -250,6 +344,43 @@ class HALight(HABaseDeviceType):
         temperature = int(payload)
         self._color_temperature_callback and self._color_temperature_callback(self, temperature)
 
+    def _handle_json_command(self, payload: bytes) -> None:
+        import json
+
+        try:
+            command = json.loads(payload)
+        except ValueError:
+            return
+
+        self._json_held = False
+        try:
+            self._dispatch_json_command(command)
+        finally:
+            held = self._json_held
+            self._json_held = None
+        held and self._publish_json_state()
+
+    def _dispatch_json_command(self, command) -> None:
+        transition = command.get("transition")
+        if transition is not None and self._transition_callback:
+            self._transition_callback(self, transition)
+
+        state = command.get("state")
+        if state is not None and self._state_callback:
+            self._state_callback(self, state == constants.HAStateOn)
+
+        brightness = command.get("brightness")
+        if brightness is not None and self._brightness_callback:
+            self._brightness_callback(self, brightness)
+
+        temperature = command.get("color_temp")
+        if temperature is not None and self._color_temperature_callback:
+            self._color_temperature_callback(self, temperature)
+
+        color = command.get("color")
+        if color is not None and self._rgb_color_callback:
+            self._rgb_color_callback(self, color.get("r", 0), color.get("g", 0), color.get("b", 0))
+
     def _handle_rgb_color_command(self, payload: bytes) -> None:
         r, g, b = payload.split(b",")
         self._rgb_color_callback and self._rgb_color_callback(self, int(r), int(g), int(b)
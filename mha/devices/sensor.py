@@ -0,0 +1,186 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+from array import array
+from .basic_device import HABaseDeviceType
+from ..utils.serializer import HASerializer
+from ..utils.ticks import ticks_ms, ticks_diff
+from ..utils import constants
+
+_AggregateTemplate = "{{ value_json.mean }}"
+
+
+class HASensor(HABaseDeviceType):
+
+    __slots__ = (
+        "_class", "_state_class", "_icon", "_unit_of_measurement", "_entity_category",
+        "_force_update", "_expire_after", "_current_value",
+        "_window", "_window_pos", "_window_count", "_interval", "_deadband", "_published_at",
+    )
+
+    def __init__(self, unique_id) -> None:
+        super().__init__(constants.HAComponentSensor, unique_id)
+        self._class = None
+        self._state_class = None
+        self._icon = None
+        self._unit_of_measurement = None
+        self._entity_category = None
+        self._force_update = False
+        self._expire_after = 0
+        self._current_value = None
+        self._window = None
+        self._window_pos = 0
+        self._window_count = 0
+        self._interval = 0
+        self._deadband = None
+        self._published_at = 0
+
+    def enable_aggregation(self, size=64, interval=5000, deadband=None, typecode="f") -> None:
+        """Publish min/max/mean/last of the samples given to add_sample().
+
+        Samples go into an array of `size` values (the oldest are overwritten
+        when more arrive between two publishes). The statistics are published
+        every `interval` ms, or right away when a sample is more than
+        `deadband` away from the last published mean. The state is one JSON
+        message: Home Assistant shows the mean and keeps the rest as attributes
+        (unless enable_json_attributes() is used, then the staged ones).
+        """
+        self._window = array(typecode, [0] * size)
+        self._window_pos = 0
+        self._window_count = 0
+        self._interval = interval
+        self._deadband = deadband
+        self._published_at = ticks_ms()
+        self.invalidate_config()
+
+    def is_aggregation_enabled(self) -> bool:
+        return self._window is not None
+
+    def add_sample(self, value) -> None:
+        window = self._window
+        window[self._window_pos] = value
+        self._window_pos = (self._window_pos + 1) % len(window)
+        if self._window_count < len(window):
+            self._window_count += 1
+
+        deadband = self._deadband
+        if (deadband is not None and (self._current_value is None or abs(value - self._current_value) > deadband)) \
+                or ticks_diff(ticks_ms(), self._published_at) >= self._interval:
+            self.flush()
+
+    def flush(self) -> bool:
+        """Publish the aggregated samples now."""
+        n = self._window_count
+        if n == 0:
+            return False
+
+        window = self._window
+        # the window restarts at 0 after a publish, unless it wrapped
+        start = 0 if n < len(window) else self._window_pos
+        low = high = total = window[start]
+        for i in range(1, n):
+            value = window[(start + i) % len(window)]
+            total += value
+            if value < low:
+                low = value
+            elif value > high:
+                high = value
+        mean = total / n
+        last = window[(self._window_pos - 1) % len(window)]
+
+        self._published_at = ticks_ms()
+        # formatted like the serializer does, %g would keep 6 digits only
+        payload = '{"min":%s,"max":%s,"mean":%s,"last":%s}' % (low, high, mean, last)
+        if not self.publish_on_data_topic(constants.HAStateTopic, payload):
+            return False
+
+        self._current_value = mean
+        self._window_pos = 0
+        self._window_count = 0
+        return True
+
+    def set_value(self, value, force=False) -> bool:
+        if force is False and value == self._current_value:
+            return True
+
+        if self._publish_value(value):
+            self._current_value = value
+            return True
+
+        return False
+
+    def set_current_value(self, value) -> None:
+        self._current_value = value
+
+    def get_current_value(self):
+        return self._current_value
+
+    def set_expire_after(self, expire_after: int) -> None:
+        self._expire_after = expire_after if expire_after > 0 else 0
+        self.invalidate_config()
+
+    def set_device_class(self, class_name: str) -> None:
+        self._class = class_name
+        self.invalidate_config()
+
+    def set_state_class(self, state_class: str) -> None:
+        self._state_class = state_class
+        self.invalidate_config()
+
+    def set_force_update(self, force_update: bool) -> None:
+        self._force_update = force_update
+        self.invalidate_config()
+
+    def set_icon(self, icon: str) -> None:
+        self._icon = icon
+        self.invalidate_config()
+
+    def set_unit_of_measurement(self, unit: str) -> None:
+        self._unit_of_measurement = unit
+        self.invalidate_config()
+
+    def set_entity_category(self, category: str) -> None:
+        self._entity_category = category
+        self.invalidate_config()
+
+    def build_serializer(self):
+        if self._serializer is not None or self.unique_id is None:
+            return
+
+        self._serializer = HASerializer(self)
+        self._serializer.set_kv(constants.HANameProperty, self._name)
+        self._serializer.set_kv(constants.HAObjectIdProperty, self._object_id)
+        self._serializer.set_flag(HASerializer.WithUniqueId)
+        self._serializer.set_kv(constants.HADeviceClassProperty, self._class)
+        self._serializer.set_kv(constants.HAStateClassProperty, self._state_class)
+        self._serializer.set_kv(constants.HAIconProperty, self._icon)
+        self._serializer.set_kv(constants.HAUnitOfMeasurementProperty, self._unit_of_measurement)
+        self._serializer.set_kv(constants.HAEntityCategoryProperty, self._entity_category)
+        self._force_update and self._serializer.set_kv(constants.HAForceUpdateProperty, True)
+        self._expire_after and self._serializer.set_kv(constants.HAExpireAfterProperty, self._expire_after)
+        if self._window is not None:
+            self._serializer.set_kv(constants.HAValueTemplateProperty, _AggregateTemplate)
+            self._serializer.set_kv(constants.HAJsonAttributesTopic, self.get_data_topic(constants.HAStateTopic))
+
+        self._serializer.set_flag(HASerializer.WithDevice)
+        self._serializer.set_flag(HASerializer.WithAvailability)
+        self._serializer.set_topic(constants.HAStateTopic)
+
+    def on_mqtt_connected(self):
+        if self.unique_id is None:
+            return
+
+        print("MHA: HASensor on_mqtt_connected")
+
+        self.publish_config()
+        self.publish_availability()
+        if self._window is not None:
+            self.flush()
+        else:
+            self._current_value is not None and self._publish_value(self._current_value)
+
+    def _publish_value(self, value) -> bool:
+        if isinstance(value, (str, bytes)):
+            return self.publish_on_data_topic(constants.HAStateTopic, value)
+        return self.publish_number_on_data_topic(constants.HAStateTopic, value)
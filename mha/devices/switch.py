@@ -9,6 +9,8 @@ from ..utils import constants
 
 class HASwitch(HABaseDeviceType):
 
+    __slots__ = ("_class", "_icon", "_retain", "_optimistic", "_current_state", "_command_callback")
+
     def __init__(self, unique_id):
         super().__init__(constants.HAComponentSwitch, unique_id)
         self._class = None
@@ -42,15 +44,19 @@ class HASwitch(HABaseDeviceType):
 
     def set_device_class(self, class_name: str) -> None:
         self._class = class_name
+        self.invalidate_config()
 
     def set_icon(self, icon: str) -> None:
         self._icon = icon
+        self.invalidate_config()
 
     def set_retain(self, retain: bool) -> None:
         self._retain = retain
+        self.invalidate_config()
 
     def set_optimistic(self, optimistic: bool) -> None:
         self._optimistic = optimistic
+        self.invalidate_config()
 
     def on_command(self, callback) -> None:
         self._command_callback = callback
@@ -83,13 +89,11 @@ class HASwitch(HABaseDeviceType):
         self.publish_config()
         self.publish_availability()
         not self._retain and self._publish_state(self._current_state)
-        self.subscribe_topic(self.unique_id, constants.HACommandTopic)
-
-    def on_message(self, topic: str, payload: str) -> None:
-        print("MHA: HASwitch on_message: ", topic, payload)
-        if self._command_callback and self._serializer and self._serializer.compare_data_topics(topic, self.unique_id, constants.HACommandTopic):
-            state = len(payload) == len(constants.HAStateOn)
-            self._command_callback(self, state)
+        self.subscribe_topic(self.unique_id, constants.HACommandTopic, self._handle_command)
 
     def _publish_state(self, state) -> bool:
-        return self.publish_on_data_topic(constants.HAStateTopic, constants.HAStateOn if state else constants.HAStateOff)
+        return self.publish_on_data_topic(constants.HAStateTopic, self.PayloadOn if state else self.PayloadOff)
+
+    def _handle_command(self, payload: bytes) -> None:
+        state = len(payload) == len(constants.HAStateOn)
+        self._command_callback and self._command_callback(self, state)
@@ -6,9 +6,17 @@ from .utils.serializer import HASerializer
 from .utils import constants
 from .ha_mqtt import HAMqtt
 
+_PayloadOnline = constants.HAOnline.encode("utf-8")
+_PayloadOffline = constants.HAOffline.encode("utf-8")
+
 
 class HADevice:
 
+    __slots__ = (
+        "_unique_id", "_owns_unique_id", "_serializer", "_availability_topic",
+        "_shared_availability", "_available", "_extended_unique_ids", "_last_will",
+    )
+
     def __init__(self, unique_id: str) -> None:
         self._unique_id = unique_id
         self._owns_unique_id = False
@@ -17,6 +25,7 @@ class HADevice:
         self._shared_availability = False
         self._available = True
         self._extended_unique_ids = False
+        self._last_will = False
         self._serializer.set_kv(constants.HADeviceIdentifiersProperty, unique_id)
 
     def get_unique_id(self) -> str:
@@ -31,7 +40,10 @@ class HADevice:
     def is_extended_unique_ids_enabled(self) -> bool:
         return self._extended_unique_ids
 
-    def get_availability_topic(self) -> str:
+    def get_availability_topic(self) -> bytes:
+        if self._shared_availability and self._availability_topic is None:
+            topic = HASerializer.generate_data_topic(None, constants.HAAvailabilityTopic, self)
+            self._availability_topic = topic.encode("utf-8") if topic is not None else None
         return self._availability_topic
 
     def is_available(self) -> bool:
@@ -45,25 +57,38 @@ class HADevice:
         self._owns_unique_id = True
         self._serializer.set_kv(constants.HADeviceIdentifiersProperty, unique_id)
 
+        mqtt = HAMqtt.instance()
+        if mqtt is not None:
+            mqtt.invalidate_topics()
+        else:
+            self.invalidate_topics()
+
+    def _invalidate_configs(self):
+        mqtt = HAMqtt.instance()
+        mqtt is not None and mqtt.invalidate_configs()
+
+    def invalidate_topics(self):
+        self._availability_topic = None
+
     def set_manufacturer(self, manufacturer: str):
-        self._manufacturer = manufacturer
         self._serializer.set_kv(constants.HADeviceManufacturerProperty, manufacturer)
+        self._invalidate_configs()
 
     def set_model(self, model: str):
-        self._model = model
         self._serializer.set_kv(constants.HADeviceModelProperty, model)
+        self._invalidate_configs()
 
     def set_name(self, name: str):
-        self._name = name
         self._serializer.set_kv(constants.HANameProperty, name)
+        self._invalidate_configs()
 
     def set_software_version(self, software_version: str):
-        self._software_version = software_version
         self._serializer.set_kv(constants.HADeviceSoftwareVersionProperty, software_version)
+        self._invalidate_configs()
 
     def set_configuration_url(self, configuration_url: str):
-        self._configuration_url = configuration_url
         self._serializer.set_kv(constants.HADeviceConfigurationUrlProperty, configuration_url)
+        self._invalidate_configs()
 
     def set_availability(self, online: bool):
         self._available = online
@@ -73,20 +98,37 @@ class HADevice:
         if self._shared_availability:
             return True
 
-        self._availability_topic = self._serializer.generate_data_topic(constants.HAAvailabilityTopic)
+        self._shared_availability = True
+        self._availability_topic = None
+        self._invalidate_configs()
         return True
 
     def enable_last_will(self):
+        """A connection has one last will; with several devices the last caller owns it.
+
+        Needs shared availability. Called before HAMqtt exists, the last will
+        is set by HAMqtt.begin().
+        """
+        if not self._shared_availability:
+            raise ValueError("the last will needs shared availability")
+
+        self._last_will = True
         mqtt = HAMqtt.instance()
-        if mqtt is None or self._availability_topic is None:
+        topic = self.get_availability_topic()
+        if mqtt is None or topic is None:
             return
 
-        mqtt.set_last_will(self._availability_topic, constants.HAOffline, retain=True)
+        mqtt.set_last_will(topic, _PayloadOffline, retain=True)
+        # entities of the other devices reference this topic too
+        self._invalidate_configs()
+
+    def is_last_will_enabled(self) -> bool:
+        return self._last_will
 
     def publish_availability(self):
         mqtt = HAMqtt.instance()
-        if mqtt is None or self._availability_topic is None:
+        topic = self.get_availability_topic()
+        if mqtt is None or topic is None:
             return
 
-        payload = constants.HAOnline if self._available else constants.HAOffline
-        mqtt.publish(self._availability_topic, payload, retain=True)
+        mqtt.publish(topic, _PayloadOnline if self._available else _PayloadOffline, True)
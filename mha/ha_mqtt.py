@@ -2,87 +2,538 @@
 #
 # SPDX-License-Identifier: MIT
 
-from .umqtt import MQTTClient
+from .umqtt import MQTTClient, MQTTException
+from .utils.metrics import Metrics
+from .utils import constants
+from .utils.ticks import ticks_ms, ticks_us, ticks_diff, ticks_add
+
+# metrics published by enable_diagnostics(): attribute, name, unit, state class
+_DIAGNOSTICS = (
+    ("messages_in", "MQTT messages received", None, "total_increasing"),
+    ("messages_out", "MQTT messages sent", None, "total_increasing"),
+    ("bytes_in", "MQTT bytes received", "B", "total_increasing"),
+    ("bytes_out", "MQTT bytes sent", "B", "total_increasing"),
+    ("reconnects", "MQTT reconnects", None, "total_increasing"),
+    ("publish_failures", "MQTT publish failures", None, "total_increasing"),
+    ("dispatch_time_max", "Message dispatch time", "us", "measurement"),
+    ("loop_time_max", "Loop time", "us", "measurement"),
+    ("free_heap", "Free heap", "B", "measurement"),
+)
 
 
 class HAMqtt:
+    # print every received message
+    DEBUG = False
     _instance = None
 
     def __new__(cls, *args, **kw):
-        if cls._instance is None:
-            cls._instance = object.__new__(cls)
-        return cls._instance
+        # stored on HAMqtt itself so subclasses share the same instance slot
+        if HAMqtt._instance is None:
+            HAMqtt._instance = object.__new__(cls)
+        return HAMqtt._instance
 
     @classmethod
     def instance(cls):
         return cls._instance
 
     def __init__(self, device) -> None:
-        self.discovery_prefix = "homeassistant"
-        self.data_prefix = "homeassistant"
+        self._discovery_prefix = "homeassistant"
+        self._data_prefix = "homeassistant"
         self.device = device
+        self._devices = [] if device is None else [device]
         self.on_message = None
         self.on_connect = None
         self.on_disconnect = None
         self.on_state_changed = None
         self._device_types = []
+        self._routes = {}
+        self._pending_subscriptions = None
+        # topics subscribed before the data prefix or a unique id changed
+        self._stale_topics = None
+        # topics per SUBSCRIBE packet when (re)subscribing on connect
+        self.subscribe_batch = 64
+        self._wildcard_subscription = False
+        self._wildcard_topics = {}
+        self._pending_configs = []
+        self._config_cache = True
+        # retained configs being compared after connect: topic -> entity,
+        # and the entities whose retained config turned out stale
+        self._config_checks = None
+        self._config_check_topics = None
+        self._config_stale = None
+        self._config_check_timeout = 0
+        self._config_check_at = 0
+        self._publish_queue = None
+        self._publish_interval = 0
+        self._last_publish_flush = 0
+        self._offline_buffer = None
+        self._offline_drain_rate = 0
+        self.metrics = Metrics()
+        self._diagnostics = None
+        self._diagnostics_interval = 0
+        self._last_diagnostics = 0
+        # events per device trigger ring, written from IRQs
+        self.trigger_buffer_size = 32
+        self._triggers = None
+        self._trigger_events = None
+        self._trigger_overflows = 0
 
         self._last_will_topic = None
         self._last_will_message = None
         self._last_will_retain = None
 
+        # reconnect backoff in ms, doubled after every failed attempt
+        self.reconnect_min_delay = 1000
+        self.reconnect_max_delay = 60000
+        self.connect_timeout = 5000
+
         self._client = None
         self._current_state = MQTTClient.StateDisconnected
+        self._reconnect = False
+        self._reconnect_delay = 0
+        self._reconnect_at = 0
+        self._clean_session = True
+
+    @property
+    def discovery_prefix(self):
+        return self._discovery_prefix
+
+    @discovery_prefix.setter
+    def discovery_prefix(self, prefix):
+        self._discovery_prefix = prefix
+        self.invalidate_topics()
+
+    @property
+    def data_prefix(self):
+        return self._data_prefix
+
+    @data_prefix.setter
+    def data_prefix(self, prefix):
+        self._data_prefix = prefix
+        self.invalidate_topics()
+
+    def invalidate_topics(self):
+        # once subscribed, the old topics are dropped and the entities
+        # announced again, which routes and subscribes the new ones
+        if self._client is not None:
+            stale = self._stale_topics or []
+            stale.extend(self._routes)
+            stale.extend(self._wildcard_topics.values())
+            self._stale_topics = stale
+        self._routes = {}
+        self._wildcard_topics = {}
+        for device in self._devices:
+            device.invalidate_topics()
+        for device in self._device_types:
+            device.invalidate_topics()
+        for device in self._devices:
+            device.is_last_will_enabled() and device.enable_last_will()
+
+    def invalidate_configs(self):
+        for device in self._device_types:
+            device.invalidate_config()
+
+    def schedule_config(self, device_type):
+        self._pending_configs.append(device_type)
 
     def get_state(self):
-        raise NotImplementedError
+        return self._current_state
 
-    def begin(self, server, port=1883, user=None, password=None):
-        self._client = MQTTClient(b"umqtt_client", server, port, user, password)
-        self._client.connect()
+    def begin(self, server, port=1883, user=None, password=None, keepalive=15):
+        for device in self._devices:
+            device.is_last_will_enabled() and device.enable_last_will()
+        self._client = MQTTClient(b"umqtt_client", server, port, user, password, keepalive)
+        self._client.AUTO_RECONNECT = False
         if self._last_will_topic is not None:
             self._client.set_last_will(
                 self._last_will_topic, self._last_will_message, retain=self._last_will_retain
             )
         self._client.set_callback(self._on_message)
+        self._reconnect = True
+        self._reconnect_delay = 0
+        self._clean_session = True
+        self._connect()
 
     def disconnect(self):
-        if self._client is not None:
+        self._reconnect = False
+        if self._client is not None and self.is_connected():
             self._client.disconnect()
+            self._update_state()
 
     def loop(self):
-        self._client.check_msg()
-
+        start = ticks_us()
+        if self._client.get_status() == MQTTClient.StateConnected:
+            self._client.check_msg()
+        elif self._reconnect and ticks_diff(ticks_ms(), self._reconnect_at) >= 0:
+            self._connect()
+        self._process()
+        self.metrics.add_loop(ticks_diff(ticks_us(), start))
+
+    def _connect(self):
+        client = self._client
+        client.status = MQTTClient.StateConnecting
+        self._update_state()
+        try:
+            client.connect(self._clean_session, self.connect_timeout / 1000)
+        except (OSError, MQTTException) as e:
+            client.log(True, e)
+            self._schedule_reconnect()
+        else:
+            self._clean_session = False
+            self._reconnect_delay = 0
+        self._update_state()
+
+    def _schedule_reconnect(self):
+        self._reconnect_at = ticks_add(ticks_ms(), self._next_reconnect_delay())
+
+    # Capped exponential backoff with jitter: a random point in the upper
+    # half of the current delay, so a fleet does not reconnect in lockstep.
+    def _next_reconnect_delay(self):
+        from random import getrandbits
+
+        delay = self._reconnect_delay
+        delay = self.reconnect_min_delay if delay == 0 else min(delay * 2, self.reconnect_max_delay)
+        self._reconnect_delay = delay
+        half = delay // 2
+        return half + (getrandbits(16) * half >> 16)
+
+    def _update_state(self):
         status = self._client.get_status()
-        if self._current_state != status:
-            self._current_state = status
-            if status == MQTTClient.StateConnected:
-                self._on_connect(None, None, None, None, None)
-            elif status == MQTTClient.StateDisconnected:
-                self._on_disconnect(None, None, None)
+        if self._current_state == status:
+            return
+
+        previous = self._current_state
+        self._current_state = status
+        if self.on_state_changed is not None:
+            self.on_state_changed(status)
+
+        if status == MQTTClient.StateConnected:
+            metrics = self.metrics
+            if metrics.connects:
+                metrics.reconnects += 1
+            metrics.connects += 1
+            self._on_connect(None, None, None, None, None)
+        elif previous == MQTTClient.StateConnected:
+            self._on_disconnect(None, None, None)
+            self._reconnect and self._schedule_reconnect()
+
+    def get_ping_rtt(self):
+        """Round trip of the last keepalive PINGREQ in ms, None if not measured yet."""
+        if self._client is None:
+            return None
+        return self._client.ping_rtt
+
+    def _process(self):
+        if self._current_state == MQTTClient.StateConnected:
+            self._client.check_inflight()
+            self._client.check_keepalive()
+        self._update_state()
+        status = self._current_state
+
+        if self._config_check_topics is not None and (
+            not self._config_checks or ticks_diff(ticks_ms(), self._config_check_at) >= 0
+        ):
+            self._finish_config_check()
+
+        if self._stale_topics is not None and status == MQTTClient.StateConnected:
+            self._reannounce()
+
+        if self._pending_configs and status == MQTTClient.StateConnected:
+            device_types = self._pending_configs
+            self._pending_configs = []
+            for device in device_types:
+                device.publish_config()
+
+        if self._publish_queue and status == MQTTClient.StateConnected:
+            now = ticks_ms()
+            if ticks_diff(now, self._last_publish_flush) >= self._publish_interval:
+                self._last_publish_flush = now
+                self._publish_queue.flush(self._send)
+
+        if self._offline_buffer and status == MQTTClient.StateConnected:
+            self._offline_buffer.replay(self._publish, self._offline_drain_rate)
+
+        if self._trigger_events is not None:
+            status == MQTTClient.StateConnected and self._publish_triggers()
+            overflows = self._trigger_events.overflows
+            if overflows != self._trigger_overflows:
+                self.metrics.triggers_dropped += overflows - self._trigger_overflows
+                self._trigger_overflows = overflows
+
+        if self._diagnostics and status == MQTTClient.StateConnected:
+            now = ticks_ms()
+            if ticks_diff(now, self._last_diagnostics) >= self._diagnostics_interval:
+                self._last_diagnostics = now
+                self.publish_diagnostics()
 
     def is_connected(self):
         if self._client is None:
             return False
-        return self._client.is_connected() == MQTTClient.StateConnected
+        return self._client.get_status() == MQTTClient.StateConnected
+
+    def add_device(self, device):
+        """Serve another HADevice over this connection (gateway mode)."""
+        device in self._devices or self._devices.append(device)
+
+    def get_devices(self):
+        return self._devices
 
     def add_device_type(self, device_type):
         self._device_types.append(device_type)
 
-    def publish(self, topic, payload, retain=False):
-        if self._client is None:
+    def add_trigger(self, trigger):
+        """Register an HADeviceTrigger, returns its index in the event ring."""
+        if self._triggers is None:
+            from .utils.event_ring import EventRing
+            self._triggers = []
+            self._trigger_events = EventRing(self.trigger_buffer_size)
+        if len(self._triggers) > 255:
+            raise ValueError("too many device triggers")
+        self._triggers.append(trigger)
+        return len(self._triggers) - 1
+
+    def get_trigger_events(self):
+        return self._trigger_events
+
+    def _publish_triggers(self):
+        events = self._trigger_events
+        triggers = self._triggers
+        while True:
+            i = events.peek()
+            # events are never coalesced by the publish queue; a refused
+            # publish stays in the ring for the next loop
+            if i < 0 or not self._send(triggers[i].get_data_topic(constants.HATopic), b"", False):
+                return
+            events.pop()
+
+    def add_route(self, topic, device_type, handler):
+        self._routes[topic] = (device_type, handler)
+
+    def publish(self, topic, payload, retain=False, qos=0, callback=None):
+        """QoS 1/2 messages do not wait for the broker; `callback(pid)` runs on acknowledgement."""
+        if self._client is None and self._offline_buffer is None:
+            return False
+
+        # a message with a completion callback cannot be coalesced away
+        if self._publish_queue is not None and callback is None:
+            self._publish_queue.put(topic, payload, retain, qos)
+            return True
+
+        return self._send(topic, payload, retain, qos, callback)
+
+    def _send(self, topic, payload, retain, qos=0, callback=None):
+        buffer = self._offline_buffer
+        if buffer is None:
+            if self._publish(topic, payload, retain, qos, callback):
+                return True
+            # only messages that are lost count, buffered ones go out later
+            self.metrics.publish_failures += 1
+            return False
+
+        # messages buffered earlier go out first, keep the order; the
+        # announcements from _on_connect() never wait behind the backlog
+        backlog = len(buffer) and self._pending_subscriptions is None
+        if backlog or not self._publish(topic, payload, retain, qos, callback):
+            buffer.put(topic, payload, retain, qos, callback)
+        return True
+
+    def _publish(self, topic, payload, retain, qos=0, callback=None):
+        if not self.is_connected():
+            return False
+
+        try:
+            self._client.publish(topic, payload, retain, qos, callback)
+        except OSError:
+            return False
+        self._count_out(topic, len(payload))
+        return True
+
+    def _count_out(self, topic, size):
+        metrics = self.metrics
+        metrics.messages_out += 1
+        metrics.bytes_out += len(topic) + size
+
+    def enable_publish_queue(self, interval=0):
+        """Coalesce publishes per topic and send them from loop(), at most every `interval` ms."""
+        if self._publish_queue is None:
+            from .utils.publish_queue import PublishQueue
+
+            self._publish_queue = PublishQueue()
+            self._last_publish_flush = ticks_ms()
+        self._publish_interval = interval
+
+    def flush_publish_queue(self):
+        if self._publish_queue and self.is_connected():
+            self._last_publish_flush = ticks_ms()
+            self._publish_queue.flush(self._send)
+
+    def enable_offline_buffer(self, size=32, path=None, drain_rate=4, max_file_size=65536):
+        """Keep publishes made while disconnected and replay `drain_rate` of them per loop().
+
+        Up to `size` messages are held in RAM, older ones spill to the file
+        at `path` when given. Retained messages are kept once per topic.
+        """
+        if self._offline_buffer is None:
+            from .utils.offline_buffer import OfflineBuffer
+
+            self._offline_buffer = OfflineBuffer(size, path, max_file_size)
+        self._offline_drain_rate = drain_rate
+
+    def enable_diagnostics(self, interval=60000):
+        """Publish the metrics as diagnostic sensors of the device every `interval` ms."""
+        if self._diagnostics is None:
+            from .devices.sensor import HASensor
+
+            diagnostics = []
+            for key, name, unit, state_class in _DIAGNOSTICS:
+                if key == "free_heap" and Metrics.free_heap() is None:
+                    continue
+                sensor = HASensor("mha_" + key)
+                sensor.set_name(name)
+                sensor.set_unit_of_measurement(unit)
+                sensor.set_state_class(state_class)
+                sensor.set_entity_category(constants.HAEntityCategoryDiagnostic)
+                # announced by on_mqtt_connected(), or right away when already connected
+                self.is_connected() and self.schedule_config(sensor)
+                diagnostics.append((key, sensor))
+            self._diagnostics = diagnostics
+            self._last_diagnostics = ticks_ms()
+        self._diagnostics_interval = interval
+
+    def publish_diagnostics(self):
+        if not self._diagnostics:
+            return
+
+        metrics = self.metrics
+        for key, sensor in self._diagnostics:
+            value = metrics.free_heap() if key == "free_heap" else getattr(metrics, key)
+            sensor.set_value(value)
+        metrics.reset_max()
+
+    def get_offline_buffer(self):
+        return self._offline_buffer
+
+    def publish_stream(self, topic, size, write, retain=False):
+        """Publish a `size` byte payload produced by `write(out)` without buffering it."""
+        if not self.is_connected():
+            self.metrics.publish_failures += 1
+            return False
+
+        try:
+            self._client.begin_publish(topic, size, retain=retain)
+            write(self._client)
+            self._client.end_publish()
+        except OSError:
+            self.metrics.publish_failures += 1
             return False
+        self._count_out(topic, size)
+        return True
 
-        self._client.publish(topic, payload, retain=retain)
+    def publish_from(self, topic, source, size, retain=False, qos=0, b64=False):
+        """Publish `size` bytes read from a file, iterable or buffer (see MQTTClient.publish_from)."""
+        if not self.is_connected():
+            self.metrics.publish_failures += 1
+            return False
+
+        try:
+            # None: the asyncio client refused it, its in-flight window is full
+            pid = self._client.publish_from(topic, source, size, retain, qos, None, b64)
+        except (OSError, ValueError):
+            pid = None
+        if pid is None:
+            self.metrics.publish_failures += 1
+            return False
+        self._count_out(topic, (size + 2) // 3 * 4 if b64 else size)
         return True
 
+    def enable_config_check(self, timeout=1000):
+        """After connecting, republish only configs the broker does not retain unchanged.
+
+        The config topics are subscribed to for up to `timeout` ms and the
+        retained payloads compared by CRC-32 with the local configs.
+        """
+        self._config_check_timeout = timeout
+
+    def defer_config(self, device_type, topic):
+        # only configs announced from _on_connect() are checked
+        if self._config_checks is None or self._pending_subscriptions is None:
+            return False
+
+        self._config_checks[topic] = device_type
+        self._config_check_topics.append(topic)
+        self.subscribe(topic)
+        return True
+
+    def _finish_config_check(self):
+        device_types = self._config_stale
+        device_types.extend(self._config_checks.values())
+        topics = self._config_check_topics
+        self._config_checks = None
+        self._config_check_topics = None
+        self._config_stale = None
+        if not self.is_connected():
+            return
+
+        batch = self.subscribe_batch
+        try:
+            for i in range(0, len(topics), batch):
+                self._client.unsubscribe_multiple(topics[i:i + batch])
+        except OSError:
+            return
+
+        # stale or not retained: announce them, and their state, again.
+        # Their command topics were subscribed by _on_connect() already,
+        # the subscriptions made here are collected and dropped.
+        self._pending_subscriptions = {}
+        for device_type in device_types:
+            device_type.on_mqtt_connected()
+        self._pending_subscriptions = None
+
+    def disable_config_cache(self):
+        self._config_cache = False
+
+    def is_config_cache_enabled(self):
+        return self._config_cache
+
     def subscribe(self, topic):
-        if self._client is None:
+        if not self.is_connected():
             return False
 
-        self._client.subscribe(topic)
+        if self._pending_subscriptions is not None:
+            self._pending_subscriptions[topic] = True
+            return True
+
+        try:
+            self._client.subscribe(topic)
+        except OSError:
+            return False
         return True
 
+    def enable_wildcard_subscription(self):
+        self._wildcard_subscription = True
+
+    def is_wildcard_subscription_enabled(self):
+        return self._wildcard_subscription
+
+    def get_wildcard_topic(self, topic, device=None):
+        device = device or self.device
+        key = (device.get_unique_id(), topic)
+        full_topic = self._wildcard_topics.get(key)
+        if full_topic is None:
+            full_topic = self._wildcard_topics[key] = "/".join(
+                [self._data_prefix, key[0], "+", topic]
+            ).encode("utf-8")
+        return full_topic
+
+    def get_availability_last_will(self):
+        """The last will topic if it is the availability topic of one of the devices."""
+        topic = self._last_will_topic
+        if topic is not None:
+            for device in self._devices:
+                if device.get_availability_topic() == topic:
+                    return topic
+        return None
+
     def set_last_will(self, topic, payload, retain=False):
         self._last_will_topic = topic
         self._last_will_message = payload
@@ -95,23 +546,91 @@ class HAMqtt:
             self._client.set_last_will(topic, payload, retain=retain)
 
     def process_messages(self, topic, payload):
-        print("MHA: received call %s, len: %d" % (topic, len(payload)))
+        self.DEBUG and print("MHA: received call %s, len: %d" % (topic, len(payload)))
+        metrics = self.metrics
+        metrics.messages_in += 1
+        metrics.bytes_in += len(topic) + len(payload)
+        start = ticks_us()
+
+        if self._config_checks:
+            device_type = self._config_checks.pop(topic, None)
+            if device_type is not None:
+                # republished from loop(), this may run inside a SUBSCRIBE
+                device_type.check_config(payload) or self._config_stale.append(device_type)
+                return
+
         if self.on_message is not None:
             self.on_message(topic, payload)
 
-        for device in self._device_types:
-            device.on_message(topic, payload)
+        route = self._routes.get(topic)
+        if route is not None:
+            route[1](payload)
+        else:
+            for device in self._device_types:
+                device.on_message(topic, payload)
+
+        metrics.add_dispatch(ticks_diff(ticks_us(), start))
 
     def _on_connect(self, client, userdata, flags, reason_code, properties):
         print("MHA: MQTT connected")
 
+        # collect every subscription made while announcing the entities
+        # and send them in as few SUBSCRIBE packets as possible
+        self._pending_subscriptions = {}
+        # every config is about to be published anyway
+        self._pending_configs = []
+        if self._config_check_timeout:
+            self._config_checks = {}
+            self._config_check_topics = []
+            self._config_stale = []
+            self._config_check_at = ticks_add(ticks_ms(), self._config_check_timeout)
+
+        # older messages first, what is announced below is newer
+        buffer = self._offline_buffer
+        buffer and buffer.replay(self._publish, len(buffer))
+
         if self.on_connect is not None:
             self.on_connect()
 
-        self.device.publish_availability()
+        for device in self._devices:
+            device.publish_availability()
+
+        for device in self._device_types:
+            device.on_mqtt_connected()
+            device.publish_attributes(True)
+
+        self._subscribe_pending()
+
+    # The topics changed while connected: announce everything again.
+    def _reannounce(self):
+        self._pending_subscriptions = {}
+        # every config is about to be published anyway
+        self._pending_configs = []
+        for device in self._devices:
+            device.publish_availability()
 
         for device in self._device_types:
             device.on_mqtt_connected()
+            device.publish_attributes(True)
+
+        self._subscribe_pending()
+
+    # Send the subscriptions collected while announcing in as few
+    # SUBSCRIBE packets as possible, then drop the stale topics.
+    def _subscribe_pending(self):
+        subscribed = self._pending_subscriptions
+        self._pending_subscriptions = None
+        topics = [(topic, 0) for topic in subscribed]
+        stale = [topic for topic in self._stale_topics or () if topic not in subscribed]
+        self._stale_topics = None
+        batch = self.subscribe_batch
+        try:
+            for i in range(0, len(topics), batch):
+                self.is_connected() and self._client.subscribe_multiple(topics[i:i + batch])
+            for i in range(0, len(stale), batch):
+                self.is_connected() and self._client.unsubscribe_multiple(stale[i:i + batch])
+        except OSError:
+            pass
 
     def _on_message(self, topic, payload):
         self.process_messages(topic, payload)
@@ -121,6 +640,3 @@ class HAMqtt:
 
         if self.on_disconnect is not None:
             self.on_disconnect()
-
-        if self.on_state_changed is not None:
-            self.on_state_changed(False)
@@ -0,0 +1,97 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import asyncio
+from .ha_mqtt import HAMqtt
+from .umqtt import MQTTClient, MQTTException
+from .umqtt.aio import MQTTClientAsync
+from .utils.ticks import ticks_ms, ticks_us, ticks_diff
+
+
+class HAMqttAsync(HAMqtt):
+    """HAMqtt driven by asyncio instead of a busy `loop()`.
+
+    `await mqtt.run()` (usually as its own task) connects, reconnects and
+    services the connection. Entity calls such as `set_state()` stay plain
+    method calls: they queue the packet and return without waiting on the
+    network, `await mqtt.drain()` waits until it has been handed to the
+    socket.
+    """
+
+    def __init__(self, device) -> None:
+        super().__init__(device)
+        self.poll_interval = 0.05
+
+    def begin(self, server, port=1883, user=None, password=None, keepalive=15):
+        self._client = MQTTClientAsync(b"umqtt_client", server, port, user, password, keepalive)
+        if self._last_will_topic is not None:
+            self._client.set_last_will(
+                self._last_will_topic, self._last_will_message, retain=self._last_will_retain
+            )
+        self._client.set_callback(self._on_message)
+        self._reconnect = True
+        self._reconnect_delay = 0
+        self._reconnect_at = ticks_ms()
+        self._clean_session = True
+
+    async def run(self):
+        client = self._client
+        while self._reconnect:
+            delay = ticks_diff(self._reconnect_at, ticks_ms())
+            if delay > 0:
+                await asyncio.sleep(delay / 1000)
+
+            client.status = MQTTClient.StateConnecting
+            self._update_state()
+            try:
+                await asyncio.wait_for(client.connect(self._clean_session), self.connect_timeout / 1000)
+            except asyncio.TimeoutError as e:
+                client.close()
+                client.status = MQTTClient.StateConnectionTimeout
+                client.log(True, e)
+            except (OSError, MQTTException) as e:
+                client.log(True, e)
+
+            if client.get_status() != MQTTClient.StateConnected:
+                self._update_state()
+                self._schedule_reconnect()
+                continue
+
+            self._clean_session = False
+            self._reconnect_delay = 0
+            reader = asyncio.create_task(client.reader())
+            writer = asyncio.create_task(client.writer())
+            try:
+                while client.get_status() == MQTTClient.StateConnected:
+                    start = ticks_us()
+                    self._process()
+                    self.metrics.add_loop(ticks_diff(ticks_us(), start))
+                    await asyncio.sleep(self.poll_interval)
+            finally:
+                reader.cancel()
+                writer.cancel()
+                client.close()
+            self._process()
+
+    async def drain(self):
+        if self._client is not None:
+            await self._client.drain()
+
+    async def disconnect(self):
+        self._reconnect = False
+        if self._client is not None and self.is_connected():
+            await self._client.disconnect()
+            self._update_state()
+
+    def loop(self):
+        raise NotImplementedError("use 'await run()'")
+
+    def _publish(self, topic, payload, retain, qos=0, callback=None):
+        if not self.is_connected():
+            return False
+
+        if self._client.publish(topic, payload, retain=retain, qos=qos, callback=callback) is None:
+            return False
+        self._count_out(topic, len(payload))
+        return True
@@ -3,9 +3,10 @@
 #
 # SPDX-License-Identifier: MIT
 
-import socket
 import struct
+import sys
 import time
+from ..utils.ticks import ticks_ms, ticks_diff
 # from binascii import hexlify
 
 
@@ -13,9 +14,40 @@ class MQTTException(Exception):
     pass
 
 
+def _is_timeout(e):
+    # CPython raises TimeoutError, MicroPython OSError(ETIMEDOUT)
+    return e.errno in (110, 116) or type(e).__name__ in ("timeout", "TimeoutError")
+
+
+# Payload pieces for publish_from(): `buf` is filled by file-like
+# sources with readinto(), bytes-like sources are cut into views.
+def _chunks(source, buf):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = memoryview(source)
+        for i in range(0, len(source), len(buf)):
+            yield source[i:i + len(buf)]
+    elif hasattr(source, "readinto"):
+        while 1:
+            n = source.readinto(buf)
+            if not n:
+                return
+            yield buf if n == len(buf) else buf[:n]
+    elif hasattr(source, "read"):
+        while 1:
+            chunk = source.read(len(buf))
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
 class MQTTClient:
     DELAY = 2
     DEBUG = False
+    # reconnect inline from publish()/check_msg()/wait_msg(); when False
+    # errors are reported through the status and the caller reconnects
+    AUTO_RECONNECT = True
     StateConnecting = -5
     StateConnectionTimeout = -4
     StateConnectionLost = -3
@@ -37,6 +69,7 @@ class MQTTClient:
         password=None,
         keepalive=0,
         ssl=None,
+        buffer_size=512,
     ):
         if port == 0:
             port = 8883 if ssl else 1883
@@ -55,20 +88,138 @@ class MQTTClient:
         self.lw_qos = 0
         self.lw_retain = False
         self.status = self.StateDisconnected
+        self._stream_pid = 0
+        # bytes of a streamed publish staged in the write buffer
+        self._stream_pos = 0
+        # unacknowledged QoS 1/2 publishes by packet id:
+        # [state, topic, msg, retain, qos, sent_at, callback]
+        # state 0 waits for PUBACK/PUBREC, 1 (PUBREL sent) for PUBCOMP
+        self._inflight = {}
+        # incoming QoS 2 packet ids delivered but not released yet
+        self._qos2_rx = set()
+        self.max_inflight = 8
+        # retransmit unacknowledged packets after this many ms
+        self.retry_timeout = 10000
+        self._ack = bytearray(4)
+        # outgoing packets are assembled here and sent with a single write
+        self._wbuf = memoryview(bytearray(buffer_size))
+        # incoming bytes are read in bulk and split into packets from here
+        self._rbuf = bytearray(buffer_size)
+        self._rmv = memoryview(self._rbuf)
+        self._rstart = 0
+        self._rend = 0
+        self._readinto = None
+        # socket has MicroPython's stream write(buf, n), chosen in connect()
+        self._write_n = False
+        self._blocking = True
+        self._resp = b""
+        self._last_tx = 0
+        self._ping_sent = None
+        # PINGRESP deadline in ms, and the last measured round trip
+        self.ping_timeout = 5000
+        self.ping_rtt = None
 
     def _send_str(self, s):
-        self.sock.send(struct.pack("!H", len(s)))
-        self.sock.send(s)
+        self._write(struct.pack("!H", len(s)))
+        self._write(s)
 
-    def _recv_len(self):
+    # Send all of buf. On a non-blocking socket send() may take part of
+    # it or nothing (EAGAIN) while the send buffer is full; that is
+    # retried until no progress was made for ping_timeout.
+    def _write(self, buf):
+        self._last_tx = start = ticks_ms()
+        while 1:
+            try:
+                n = self.sock.send(buf)
+            except OSError as e:
+                if e.errno not in (11, 35):
+                    raise
+                n = None
+            if n:
+                if n >= len(buf):
+                    return
+                buf = memoryview(buf)[n:]
+                start = ticks_ms()
+            elif ticks_diff(ticks_ms(), start) >= self.ping_timeout:
+                raise OSError(110, "send timeout")
+            else:
+                time.sleep_ms(1) if hasattr(time, "sleep_ms") else time.sleep(0.001)
+
+    # Send the first n bytes of the write buffer. MicroPython streams take
+    # a length, which saves allocating a memoryview slice per packet.
+    def _write_wbuf(self, n):
+        if not self._write_n:
+            self._write(self._wbuf[:n])
+            return
+        self._last_tx = ticks_ms()
+        sent = self.sock.write(self._wbuf, n)
+        if sent is None or sent < n:
+            self._write(self._wbuf[sent or 0:n])
+
+    def _set_blocking(self, flag):
+        if self._blocking != flag:
+            self.sock.setblocking(flag)
+            self._blocking = flag
+
+    # Make room at the end of the receive buffer.
+    def _compact(self):
+        start = self._rstart
+        end = self._rend
+        if start == end:
+            self._rstart = self._rend = 0
+        elif end == len(self._rbuf):
+            self._rbuf[: end - start] = self._rbuf[start:end]
+            self._rstart = 0
+            self._rend = end - start
+
+    # Read whatever the socket has into the receive buffer. Returns the
+    # number of bytes read, 0 if nothing is available on a non-blocking
+    # socket.
+    def _recv(self):
+        self._compact()
+        end = self._rend
+        try:
+            n = self._readinto(self._rmv[end:])
+        except OSError as e:
+            if e.errno in (11, 35):
+                return 0
+            raise
+        if n is None:
+            return 0
+        if n == 0:
+            raise OSError(-1)
+        self._rend = end + n
+        return n
+
+    # Locate the next complete packet in the receive buffer. Returns the
+    # offset and length of its variable part, or None if more bytes are
+    # needed.
+    def _parse(self):
+        buf = self._rbuf
+        start = self._rstart
+        end = self._rend
+        i = start + 1
         n = 0
         sh = 0
         while 1:
-            b = self.sock.recv(1)[0]
+            if i >= end:
+                return None
+            b = buf[i]
+            i += 1
             n |= (b & 0x7F) << sh
             if not b & 0x80:
-                return n
+                break
             sh += 7
+        if i + n > end:
+            if i + n - start > len(buf):
+                # packet larger than the buffer, grow it to fit
+                self._rbuf = bytearray(i + n - start)
+                self._rbuf[: end - start] = buf[start:end]
+                self._rmv = memoryview(self._rbuf)
+                self._rstart = 0
+                self._rend = end - start
+            return None
+        return i, n
 
     def get_status(self):
         return self.status
@@ -84,13 +235,49 @@ class MQTTClient:
         self.lw_qos = qos
         self.lw_retain = retain
 
-    def connect(self, clean_session=True):
+    def connect(self, clean_session=True, timeout=None):
+        # imported here so entities can be set up before the network stack
+        import socket
+
         self.status = self.StateConnecting  # added lbuque
-        self.sock = socket.socket()
-        addr = socket.getaddrinfo(self.server, self.port)[0][-1]
-        self.sock.connect(addr)
-        if self.ssl:
-            self.sock = self.ssl.wrap_socket(self.sock, server_hostname=self.server)
+        try:
+            self.sock = socket.socket()
+            if timeout is not None:
+                self.sock.settimeout(timeout)
+            addr = socket.getaddrinfo(self.server, self.port)[0][-1]
+            self.sock.connect(addr)
+            if self.ssl:
+                self.sock = self.ssl.wrap_socket(self.sock, server_hostname=self.server)
+            self._readinto = getattr(self.sock, "readinto", None) or self.sock.recv_into
+            # CPython's SSLSocket has a write(data) that takes no length
+            self._write_n = sys.implementation.name == "micropython" and hasattr(self.sock, "write")
+            self._blocking = True
+            self._rstart = self._rend = 0
+            self._ping_sent = None
+            self._send_connect(clean_session)
+            session_present = self._connack(self._wait_msg())
+            self._resume_session(clean_session)
+        except MQTTException as e:
+            # CONNACK return codes map onto StateBadProtocol..StateUnauthorized
+            self._close()
+            self.status = e.args[0]
+            raise
+        except OSError as e:
+            self._close()
+            self.status = self.StateConnectionTimeout if _is_timeout(e) else self.StateConnectionFailed
+            raise
+        if timeout is not None:
+            self.sock.settimeout(None)
+        return session_present
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+    def _send_connect(self, clean_session):
         premsg = memoryview(bytearray(b"\x10\0\0\0\0\0"))
         msg = bytearray(b"\x04MQTT\x04\x02\0\0")
 
@@ -116,8 +303,8 @@ class MQTTClient:
         premsg[i] = sz
 
         l = i + 2 if len(premsg) > i + 2 else len(premsg)
-        self.sock.send(premsg[:l])
-        self.sock.send(msg)
+        self._write(premsg[:l])
+        self._write(msg)
         # print(hex(len(msg)), hexlify(msg, ":"))
         self._send_str(self.client_id)
         if self.lw_topic:
@@ -126,141 +313,453 @@ class MQTTClient:
         if self.user:
             self._send_str(self.user)
             self._send_str(self.pswd)
-        resp = self.sock.recv(4)
-        assert resp[0] == 0x20 and resp[1] == 0x02
-        if resp[3] != 0:
-            raise MQTTException(resp[3])
+
+    def _connack(self, op):
+        resp = self._resp
+        if op != 0x20 or len(resp) != 2:
+            raise MQTTException(self.StateBadProtocol)
+        if resp[1] != 0:
+            raise MQTTException(resp[1])
         self.status = self.StateConnected  # added lbuque
-        return resp[2] & 1
+        return resp[0] & 1
 
     def disconnect(self):
-        self.sock.send(b"\xe0\0")
+        self._write(b"\xe0\0")
         self.sock.close()
         self.status = self.StateDisconnected  # added lbuque
 
     def ping(self):
-        self.sock.send(b"\xc0\0")
+        self._write(b"\xc0\0")
+        if self._ping_sent is None:
+            self._ping_sent = self._last_tx
 
-    def _publish(self, topic, msg, retain=False, qos=0):
-        pkt = memoryview(bytearray(b"\x30\0\0\0"))
-        pkt[0] |= qos << 1 | retain
-        sz = 2 + len(topic) + len(msg)
+    # Keepalive: send PINGREQ once nothing was written for a whole
+    # keepalive interval, and treat a PINGRESP that does not arrive
+    # within ping_timeout as a dead connection.
+    def check_keepalive(self):
+        if not self.keepalive or self.status != self.StateConnected:
+            return
+        now = ticks_ms()
+        if self._ping_sent is not None:
+            if ticks_diff(now, self._ping_sent) > self.ping_timeout:
+                self._lost(OSError(110, "PINGRESP timeout"))
+        elif ticks_diff(now, self._last_tx) >= self.keepalive * 1000:
+            try:
+                self.ping()
+            except OSError as e:
+                self._lost(e)
+
+    def _publish(self, topic, msg, retain=False, qos=0, callback=None):
+        pid = 0
+        if qos > 0:
+            if isinstance(msg, memoryview):
+                # kept for retransmission, the buffer may be reused
+                msg = bytes(msg)
+            pid = self._track(topic, msg, retain, qos, callback)
+        self._send_publish(topic, msg, retain, qos, pid, False)
+        qos > 0 and self._sent(pid)
+        return pid
+
+    def _send_publish(self, topic, msg, retain, qos, pid, dup):
+        n = self._pack_publish(topic, len(msg), retain, qos, pid, dup)
+        end = n + len(msg)
+        if end <= len(self._wbuf):
+            self._wbuf[n:end] = msg
+            self._write_wbuf(end)
+        else:
+            # payload larger than the buffer: header and payload separately
+            self._write(self._wbuf[:n])
+            self._write(msg)
+
+    # Assemble the PUBLISH fixed header, topic and packet id into the
+    # write buffer. Returns the header length.
+    def _pack_publish(self, topic, size, retain, qos, pid, dup):
+        sz = 2 + len(topic) + size
         if qos > 0:
             sz += 2
-        assert sz < 2097152
+        # largest remaining length the 4 byte encoding can express
+        assert sz < 268435456
+        # fixed header, topic length, topic and packet id
+        n = 5 + 2 + len(topic) + 2
+        if n > len(self._wbuf):
+            self._wbuf = memoryview(bytearray(n))
+        pkt = self._wbuf
+        pkt[0] = 0x30 | dup << 3 | qos << 1 | retain
         i = 1
         while sz > 0x7F:
             pkt[i] = (sz & 0x7F) | 0x80
             sz >>= 7
             i += 1
         pkt[i] = sz
-        # print(hex(len(pkt)), hexlify(pkt, ":"))
-        l = i + 1 if len(pkt) > i + 1 else len(pkt)
-        self.sock.send(pkt[:l])
-        self._send_str(topic)
+        i += 1
+        struct.pack_into("!H", pkt, i, len(topic))
+        i += 2
+        pkt[i:i + len(topic)] = topic
+        i += len(topic)
         if qos > 0:
-            self.pid += 1
-            pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.send(pkt[:2])
-        self.sock.send(msg)
-        if qos == 1:
-            while 1:
-                op = self._wait_msg()
-                if op == 0x40:
-                    sz = self.sock.recv(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.recv(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
-        elif qos == 2:
-            assert 0
+            struct.pack_into("!H", pkt, i, pid)
+            i += 2
+        # print(hex(i), hexlify(pkt[:i], ":"))
+        return i
+
+    def _next_pid(self):
+        pid = self.pid
+        while 1:
+            pid = pid % 65535 + 1
+            if pid not in self._inflight:
+                self.pid = pid
+                return pid
+
+    # Register an outgoing QoS 1/2 publish; waits for a free slot when
+    # the in-flight window is full.
+    def _track(self, topic, msg, retain, qos, callback):
+        if len(self._inflight) >= self.max_inflight:
+            self._wait_window()
+        pid = self._next_pid()
+        self._inflight[pid] = [0, topic, msg, retain, qos, 0, callback]
+        return pid
+
+    def _sent(self, pid):
+        entry = self._inflight.get(pid)
+        if entry is not None:
+            entry[5] = self._last_tx
+
+    # Process incoming packets until an acknowledgement frees a slot,
+    # giving up (as a lost connection) after ping_timeout.
+    def _wait_window(self):
+        self.sock.settimeout(self.ping_timeout / 1000)
+        self._blocking = True
+        try:
+            while len(self._inflight) >= self.max_inflight:
+                self._wait_msg()
+        finally:
+            self.sock.settimeout(None)
+
+    def _send_ack(self, op, pid):
+        pkt = self._ack
+        pkt[0] = op
+        pkt[1] = 2
+        struct.pack_into("!H", pkt, 2, pid)
+        self._write(pkt)
+
+    def _handle_ack(self, op, pid):
+        if op == 0x62:  # PUBREL of an incoming QoS 2 message
+            self._qos2_rx.discard(pid)
+            self._send_ack(0x70, pid)
+            return
+        entry = self._inflight.get(pid)
+        if entry is None:
+            return
+        if op == 0x50:  # PUBREC: release, the payload is no longer needed
+            entry[0] = 1
+            entry[2] = None
+            self._send_ack(0x62, pid)
+            entry[5] = self._last_tx
+            return
+        # PUBACK or PUBCOMP
+        del self._inflight[pid]
+        entry[6] is not None and entry[6](pid)
+
+    def _resend(self, pid, entry):
+        if entry[0]:
+            self._send_ack(0x62, pid)
+        elif entry[2] is not None:
+            self._send_publish(entry[1], entry[2], entry[3], entry[4], pid, True)
+        else:
+            return  # streamed payload, nothing to resend
+        entry[5] = self._last_tx
+
+    # Retransmit QoS 1/2 packets that were not acknowledged within
+    # retry_timeout. Returns the number of packets resent.
+    def check_inflight(self):
+        if not self._inflight or self.status != self.StateConnected:
+            return 0
+        now = ticks_ms()
+        n = 0
+        try:
+            for pid, entry in self._inflight.items():
+                if ticks_diff(now, entry[5]) >= self.retry_timeout:
+                    self._resend(pid, entry)
+                    n += 1
+        except OSError as e:
+            self._lost(e)
+        return n
+
+    def inflight(self):
+        return len(self._inflight)
+
+    # After CONNACK: a clean session forgets incoming QoS 2 state, and
+    # every unacknowledged outgoing packet is sent again. Streamed
+    # payloads that never got an acknowledgement are given up.
+    def _resume_session(self, clean_session):
+        if clean_session:
+            self._qos2_rx = set()
+        for pid in [pid for pid, entry in self._inflight.items() if entry[0] == 0 and entry[2] is None]:
+            del self._inflight[pid]
+        for pid, entry in self._inflight.items():
+            self._resend(pid, entry)
+
+    # Streaming publish: send the PUBLISH header for a payload of
+    # `size` bytes, then the payload in pieces with .write(), then
+    # finish with .end_publish(). The payload never has to be held
+    # in memory as a whole; QoS 1/2 streams are acknowledged but
+    # cannot be retransmitted. Returns the packet id (0 for QoS 0).
+    def begin_publish(self, topic, size, retain=False, qos=0, callback=None):
+        try:
+            pid = self._track(topic, None, retain, qos, callback) if qos > 0 else 0
+            # check_msg() leaves the socket non-blocking; a long payload
+            # waits for the broker to read instead, up to ping_timeout
+            self.sock.settimeout(self.ping_timeout / 1000)
+            self._blocking = True
+            self._stream_pos = self._pack_publish(topic, size, retain, qos, pid, False)
+            self._stream_pid = pid
+        except OSError as e:
+            self._lost(e)
+            raise
+        return pid
+
+    # Small pieces (a serializer writes token by token) are gathered in
+    # the write buffer after the header and sent whenever it fills up.
+    def write(self, data):
+        pos = self._stream_pos
+        end = pos + len(data)
+        if end <= len(self._wbuf):
+            self._wbuf[pos:end] = data
+            self._stream_pos = end
+            return
+        try:
+            self._flush_stream()
+            if len(data) < len(self._wbuf):
+                self._wbuf[:len(data)] = data
+                self._stream_pos = len(data)
+            else:
+                self._write(data)
+        except OSError as e:
+            self._lost(e)
+            raise
+
+    def _flush_stream(self):
+        n = self._stream_pos
+        self._stream_pos = 0
+        n and self._write_wbuf(n)
+
+    def end_publish(self):
+        try:
+            self._flush_stream()
+        except OSError as e:
+            self._lost(e)
+            raise
+        self._stream_pid and self._sent(self._stream_pid)
+        self._stream_pid = 0
+        self.sock.settimeout(None)
+
+    # Publish `size` bytes pulled from `source`: bytes-like, a file-like
+    # object (readinto() or read()) or an iterable of chunks, e.g. a
+    # generator refilling one memoryview. Files are read into the write
+    # buffer, so only one chunk is in memory at a time. With b64 the
+    # payload is base64 encoded on the way (4 bytes out per 3 in). A
+    # source that ends early leaves a broken packet: the connection is
+    # dropped and ValueError raised. Returns the packet id.
+    def publish_from(self, topic, source, size, retain=False, qos=0, callback=None, b64=False):
+        assert 0 <= qos <= 2
+        if b64:
+            from binascii import b2a_base64
+        pid = self.begin_publish(topic, (size + 2) // 3 * 4 if b64 else size, retain, qos, callback)
+        left = size
+        pending = b""
+        try:
+            # the write buffer is read into below: chunks bypass write()
+            self._flush_stream()
+            for chunk in _chunks(source, self._wbuf):
+                if len(chunk) > left:
+                    chunk = chunk[:left]
+                left -= len(chunk)
+                if b64:
+                    if pending:
+                        chunk = pending + bytes(chunk)
+                    # encode whole 3 byte groups, the rest waits for the next chunk
+                    n = len(chunk) if left == 0 else len(chunk) // 3 * 3
+                    pending = bytes(chunk[n:])
+                    chunk = b2a_base64(chunk[:n])[:-1]
+                chunk and self._write(chunk)
+                if left == 0:
+                    break
+        except OSError as e:
+            self._lost(e)
+            raise
+        if left:
+            self._lost(OSError(-1, "payload %d bytes short" % left))
+            raise ValueError("source ended before size bytes")
+        self.end_publish()
+        return pid
 
     def subscribe(self, topic, qos=0):
+        resp = self.subscribe_multiple(((topic, qos),))
+        if resp[0] == 0x80:
+            raise MQTTException(resp[0])
+
+    # Subscribe to several topics with a single SUBSCRIBE packet.
+    # `topics` is a sequence of (topic, qos) pairs; returns the
+    # per-topic return codes from the SUBACK (0x80 means failure).
+    def subscribe_multiple(self, topics):
+        try:
+            return self._wait_ack(0x90, self._send_subscribe(topics))
+        except OSError as e:
+            self._lost(e)
+            raise
+
+    # Process incoming packets until the `op` acknowledgement arrives and
+    # return its payload after the packet id. Giving up after ping_timeout
+    # raises OSError, which the callers treat as a lost connection.
+    def _wait_ack(self, op, pid):
+        self.sock.settimeout(self.ping_timeout / 1000)
+        self._blocking = True
+        start = ticks_ms()
+        try:
+            while self._wait_msg() != op:
+                if ticks_diff(ticks_ms(), start) >= self.ping_timeout:
+                    raise OSError(110, "no acknowledgement")
+            resp = self._resp
+            assert resp[0] << 8 | resp[1] == pid
+            return resp[2:]
+        finally:
+            self.sock.settimeout(None)
+
+    def _send_subscribe(self, topics):
         assert self.cb is not None, "Subscribe callback is not set"
-        pkt = bytearray(b"\x82\0\0\0")
-        self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
+        pkt = bytearray(b"\x82\0\0\0\0\0")
+        sz = 2
+        for topic, qos in topics:
+            sz += 2 + len(topic) + 1
+        i = 1
+        while sz > 0x7F:
+            pkt[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        pkt[i] = sz
+        pid = self._next_pid()
+        struct.pack_into("!H", pkt, i + 1, pid)
         # print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.send(pkt)
-        self._send_str(topic)
-        self.sock.send(qos.to_bytes(1, "little"))
-        self.sock.setblocking(True)
-        while 1:
-            op = self._wait_msg()
-            if op == 0x90:
-                resp = self.sock.recv(4)
-                # print(resp)
-                assert resp[1] == pkt[2] and resp[2] == pkt[3]
-                if resp[3] == 0x80:
-                    raise MQTTException(resp[3])
-                return
+        self._write(pkt[:i + 3])
+        for topic, qos in topics:
+            self._send_str(topic)
+            self._write(qos.to_bytes(1, "little"))
+        return pid
+
+    def unsubscribe(self, topic):
+        self.unsubscribe_multiple((topic,))
+
+    # Unsubscribe from several topics with a single UNSUBSCRIBE packet.
+    def unsubscribe_multiple(self, topics):
+        try:
+            self._wait_ack(0xB0, self._send_unsubscribe(topics))
+        except OSError as e:
+            self._lost(e)
+            raise
+
+    def _send_unsubscribe(self, topics):
+        pkt = bytearray(b"\xa2\0\0\0\0\0")
+        sz = 2
+        for topic in topics:
+            sz += 2 + len(topic)
+        i = 1
+        while sz > 0x7F:
+            pkt[i] = (sz & 0x7F) | 0x80
+            sz >>= 7
+            i += 1
+        pkt[i] = sz
+        pid = self._next_pid()
+        struct.pack_into("!H", pkt, i + 1, pid)
+        self._write(pkt[:i + 3])
+        for topic in topics:
+            self._send_str(topic)
+        return pid
 
     # Wait for a single incoming MQTT message and process it.
     # Subscribed messages are delivered to a callback previously
     # set by .set_callback() method. Other (internal) MQTT
     # messages processed internally.
     def _wait_msg(self):
-        res = self.sock.recv(1)
-        self.sock.setblocking(True)
-        if res is None:
-            return None
-        if res == b"":
-            raise OSError(-1)
-        if res == b"\xd0":  # PINGRESP
-            sz = self.sock.recv(1)[0]
+        frame = self._parse()
+        while frame is None:
+            if not self._recv():
+                return None
+            frame = self._parse()
+        i, sz = frame
+        end = i + sz
+        mv = self._rmv
+        op = mv[self._rstart]
+        self._rstart = end
+        if op == 0xD0:  # PINGRESP
             assert sz == 0
+            if self._ping_sent is not None:
+                self.ping_rtt = ticks_diff(ticks_ms(), self._ping_sent)
+                self._ping_sent = None
             return None
-        op = res[0]
         if op & 0xF0 != 0x30:
+            self._resp = bytes(mv[i:end])
+            if op in (0x40, 0x50, 0x62, 0x70):
+                self._handle_ack(op, mv[i] << 8 | mv[i + 1])
             return op
-        sz = self._recv_len()
-        topic_len = self.sock.recv(2)
-        topic_len = (topic_len[0] << 8) | topic_len[1]
-        topic = self.sock.recv(topic_len)
-        sz -= topic_len + 2
+        topic_len = (mv[i] << 8) | mv[i + 1]
+        i += 2
+        topic = bytes(mv[i:i + topic_len])
+        i += topic_len
         if op & 6:
-            pid = self.sock.recv(2)
-            pid = pid[0] << 8 | pid[1]
-            sz -= 2
-        msg = self.sock.recv(sz)
-        self.cb(topic, msg)
-        if op & 6 == 2:
-            pkt = bytearray(b"\x40\x02\0\0")
-            struct.pack_into("!H", pkt, 2, pid)
-            self.sock.send(pkt)
-        elif op & 6 == 4:
-            assert 0
+            pid = mv[i] << 8 | mv[i + 1]
+            i += 2
+        msg = bytes(mv[i:end])
+        qos = op & 6
+        if qos == 4:
+            # QoS 2: deliver once, duplicates until PUBREL are only acknowledged
+            if pid not in self._qos2_rx:
+                self._qos2_rx.add(pid)
+                self.cb(topic, msg)
+            self._send_ack(0x50, pid)
+        else:
+            self.cb(topic, msg)
+            qos == 2 and self._send_ack(0x40, pid)
         return op
 
     def wait_msg(self):
         while 1:
+            self._set_blocking(True)
             try:
                 return self._wait_msg()
             except OSError as e:
                 if e.errno in (11, 35):
                     return None
-                self.status = self.StateDisconnected  # added lbuque
-                self.log(False, e)
+                self._lost(e)
+            if not self.AUTO_RECONNECT:
+                return None
             self.reconnect()
 
     # Checks whether a pending message from server is available.
     # If not, returns immediately with None. Otherwise, does
-    # the same processing as wait_msg.
+    # the same processing as wait_msg, for every complete packet
+    # that arrived with the same socket read.
     def check_msg(self, attempts=2):
         while attempts:
-            self.sock.setblocking(False)
+            self._set_blocking(False)
             try:
-                return self._wait_msg()
+                res = self._wait_msg()
+                while self._parse() is not None:
+                    res = self._wait_msg()
+                return res
             except OSError as e:
                 if e.errno in (11, 35):
                     return None
-                self.status = self.StateDisconnected  # added lbuque
-                self.log(False, e)
+                self._lost(e)
+            if not self.AUTO_RECONNECT:
+                return None
             self.reconnect()
             attempts -= 1
 
+    def _lost(self, e):
+        self.status = self.StateConnectionLost  # added lbuque
+        self._close()
+        self.log(False, e)
+
     def delay(self, i):
         time.sleep(self.DELAY)
 
@@ -281,11 +780,15 @@ class MQTTClient:
                 i += 1
                 self.delay(i)
 
-    def publish(self, topic: bytes | bytearray, msg: bytes | bytearray, retain=False, qos=0):
+    # QoS 1/2 publishes return their packet id without waiting for the
+    # acknowledgement; `callback(pid)` is called once it arrives.
+    def publish(self, topic: bytes | bytearray, msg: bytes | bytearray, retain=False, qos=0, callback=None):
+        assert 0 <= qos <= 2
         while 1:
             try:
-                return self._publish(topic, msg, retain, qos)
+                return self._publish(topic, msg, retain, qos, callback)
             except OSError as e:
-                self.status = self.StateDisconnected  # added lbuque
-                self.log(False, e)
+                self._lost(e)
+                if not self.AUTO_RECONNECT:
+                    raise
             self.reconnect()
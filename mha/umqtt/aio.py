@@ -0,0 +1,180 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import asyncio
+from . import MQTTClient, MQTTException
+
+
+class _StreamSocket:
+    """Socket stand-in that hands outgoing bytes to an asyncio stream."""
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def send(self, data):
+        # the packet buffers are reused, the stream gets its own copy
+        self._writer.write(bytes(data))
+        return len(data)
+
+    def setblocking(self, flag):
+        pass
+
+    def settimeout(self, timeout):
+        pass
+
+    def close(self):
+        self._writer.close()
+
+
+class MQTTClientAsync(MQTTClient):
+    """MQTTClient variant for asyncio (CPython and MicroPython).
+
+    Packets are built and parsed by the MQTTClient code; writes only queue
+    bytes on the stream and never wait, reads happen in the `reader()` task
+    and acknowledgements are not waited for. A QoS 1/2 publish, streamed
+    or not, is refused (returns None) while the in-flight window is full.
+    """
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._reader = None
+        self._writer = None
+        self._pending = None
+        self._flush = asyncio.Event()
+
+    async def connect(self, clean_session=True):
+        self.status = self.StateConnecting  # added lbuque
+        try:
+            if self.ssl:
+                self._reader, self._writer = await asyncio.open_connection(
+                    self.server, self.port, ssl=self.ssl
+                )
+            else:
+                self._reader, self._writer = await asyncio.open_connection(self.server, self.port)
+            self.sock = _StreamSocket(self._writer)
+            self._readinto = self._readinto_pending
+            self._rstart = self._rend = 0
+            self._ping_sent = None
+            self._send_connect(clean_session)
+            await self._writer.drain()
+            while 1:
+                await self._read()
+                if self._parse() is not None:
+                    session_present = self._connack(self._wait_msg())
+                    self._resume_session(clean_session)
+                    self._flush.set()
+                    return session_present
+        except MQTTException as e:
+            self.close()
+            self.status = e.args[0]
+            raise
+        except OSError:
+            self.close()
+            self.status = self.StateConnectionFailed
+            raise
+
+    async def disconnect(self):
+        self.status = self.StateDisconnected  # added lbuque
+        try:
+            self._writer.write(b"\xe0\0")
+            await self._writer.drain()
+        except OSError:
+            pass
+        self.close()
+
+    def _lost(self, e):
+        self.status = self.StateConnectionLost  # added lbuque
+        self.close()
+        self.log(False, e)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def ping(self):
+        super().ping()
+        self._flush.set()
+
+    def publish(self, topic, msg, retain=False, qos=0, callback=None):
+        if qos > 0 and len(self._inflight) >= self.max_inflight:
+            return None
+        pid = self._publish(topic, msg, retain, qos, callback)
+        self._flush.set()
+        return pid
+
+    def check_inflight(self):
+        n = super().check_inflight()
+        n and self._flush.set()
+        return n
+
+    def begin_publish(self, topic, size, retain=False, qos=0, callback=None):
+        if qos > 0 and len(self._inflight) >= self.max_inflight:
+            return None
+        return super().begin_publish(topic, size, retain, qos, callback)
+
+    def end_publish(self):
+        super().end_publish()
+        self._flush.set()
+
+    def publish_from(self, topic, source, size, retain=False, qos=0, callback=None, b64=False):
+        if qos > 0 and len(self._inflight) >= self.max_inflight:
+            return None
+        return super().publish_from(topic, source, size, retain, qos, callback, b64)
+
+    def subscribe(self, topic, qos=0):
+        self.subscribe_multiple(((topic, qos),))
+
+    # The SUBACK is consumed by the reader task.
+    def subscribe_multiple(self, topics):
+        self._send_subscribe(topics)
+        self._flush.set()
+
+    def unsubscribe_multiple(self, topics):
+        self._send_unsubscribe(topics)
+        self._flush.set()
+
+    async def drain(self):
+        if self._writer is not None:
+            await self._writer.drain()
+
+    # Reader task: dispatch incoming packets until the connection drops.
+    async def reader(self):
+        try:
+            while 1:
+                await self._read()
+                while self._parse() is not None:
+                    op = self._wait_msg()
+                    if op == 0x90 and 0x80 in self._resp[2:]:
+                        self.log(False, MQTTException(0x80))
+                # acknowledgements for incoming QoS 1 messages
+                self._flush.set()
+        except OSError as e:
+            self._lost(e)
+
+    # Writer task: push queued bytes to the socket whenever there are some.
+    async def writer(self):
+        try:
+            while 1:
+                await self._flush.wait()
+                self._flush.clear()
+                await self._writer.drain()
+        except OSError as e:
+            self._lost(e)
+
+    async def _read(self):
+        self._compact()
+        data = await self._reader.read(len(self._rbuf) - self._rend)
+        if not data:
+            raise OSError(-1)
+        self._pending = data
+        self._recv()
+
+    def _readinto_pending(self, buf):
+        data = self._pending
+        if data is None:
+            return None
+        self._pending = None
+        buf[: len(data)] = data
+        return len(data)
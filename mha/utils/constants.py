@@ -48,6 +48,9 @@ HAIconProperty = "ic"
 HARetainProperty = "ret"
 HASourceTypeProperty = "src_type"
 HAEncodingProperty = "e"
+HAImageEncodingProperty = "img_e"
+HAAvailabilityProperty = "avty"
+HAAvailabilityModeProperty = "avty_mode"
 HAOptimisticProperty = "opt"
 HAAutomationTypeProperty = "atype"
 HATypeProperty = "type"
@@ -76,6 +79,9 @@ HAModesProperty = "modes"
 HATemperatureCommandTemplateProperty = "temp_cmd_tpl"
 HAPayloadOnProperty = "pl_on"
 HAExpireAfterProperty = "exp_aft"
+HAEntityCategoryProperty = "ent_cat"
+HASchemaProperty = "schema"
+HASupportedColorModesProperty = "sup_clrm"
 
 # topics
 HAConfigTopic = "config"
@@ -122,6 +128,9 @@ HANotHome = "not_home"
 HATrigger = "trigger"
 HAModeBox = "box"
 HAModeSlider = "slider"
+HAEntityCategoryConfig = "config"
+HAEntityCategoryDiagnostic = "diagnostic"
+HAAvailabilityModeAll = "all"
 
 # covers
 HAClosedState = "closed"
@@ -190,6 +199,13 @@ HAModeHeat = "heat"
 HAModeDry = "dry"
 HAModeFanOnly = "fan_only"
 
+# light
+HASchemaJson = "json"
+HAColorModeOnOff = "onoff"
+HAColorModeBrightness = "brightness"
+HAColorModeColorTemp = "color_temp"
+HAColorModeRGB = "rgb"
+
 # other
 HAHexMap = "0123456789abcdef"
 
@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+
+class EventRing:
+    """Preallocated ring of small integers (0-255), safe to fill from an IRQ.
+
+    There is one writer (`put`, which may run in an interrupt handler) and
+    one reader (`peek`/`pop`, from the main loop). The writer only moves
+    the tail and the reader only the head, so no lock is needed, and
+    `put` does not allocate. A full ring refuses the event and counts it
+    in `overflows`.
+    """
+
+    __slots__ = ("_buffer", "_size", "_head", "_tail", "overflows")
+
+    def __init__(self, size=32):
+        # one slot stays empty to tell a full ring from an empty one
+        self._buffer = bytearray(size + 1)
+        self._size = size + 1
+        self._head = 0
+        self._tail = 0
+        self.overflows = 0
+
+    def __len__(self):
+        return (self._tail - self._head) % self._size
+
+    def put(self, value):
+        tail = self._tail
+        next_tail = tail + 1
+        if next_tail == self._size:
+            next_tail = 0
+        if next_tail == self._head:
+            self.overflows += 1
+            return False
+        self._buffer[tail] = value
+        self._tail = next_tail
+        return True
+
+    def peek(self):
+        """Oldest event, -1 if there is none."""
+        head = self._head
+        return -1 if head == self._tail else self._buffer[head]
+
+    def pop(self):
+        head = self._head + 1
+        self._head = 0 if head == self._size else head
@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import gc
+
+
+class Metrics:
+    """Counters and timings kept by HAMqtt.
+
+    Bytes count topic and payload only. Timings are in microseconds; the
+    `*_max` values hold the worst case since the last `reset_max()`.
+    """
+
+    __slots__ = (
+        "messages_in", "messages_out", "bytes_in", "bytes_out", "connects",
+        "reconnects", "publish_failures", "triggers_dropped", "dispatch_time", "dispatch_time_max",
+        "loop_time", "loop_time_max",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.messages_in = 0
+        self.messages_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.publish_failures = 0
+        self.triggers_dropped = 0
+        self.dispatch_time = 0
+        self.loop_time = 0
+        self.reset_max()
+
+    def reset_max(self):
+        self.dispatch_time_max = 0
+        self.loop_time_max = 0
+
+    def add_dispatch(self, us):
+        self.dispatch_time = us
+        if us > self.dispatch_time_max:
+            self.dispatch_time_max = us
+
+    def add_loop(self, us):
+        self.loop_time = us
+        if us > self.loop_time_max:
+            self.loop_time_max = us
+
+    @staticmethod
+    def free_heap():
+        """Free heap in bytes, None where the port cannot tell (CPython)."""
+        return gc.mem_free() if hasattr(gc, "mem_free") else None
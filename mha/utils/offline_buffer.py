@@ -0,0 +1,166 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+import os
+import struct
+
+# spilled record: flags (retain | qos << 1), topic length, payload length
+_RECORD = "!BHI"
+_RECORD_SIZE = struct.calcsize(_RECORD)
+
+
+class OfflineBuffer:
+    """Bounded store for messages published while the broker is unreachable.
+
+    Messages are kept in a ring of `size` slots and replayed oldest first.
+    A retained message replaces the buffered retained message for the same
+    topic, only the latest state matters to the broker. When the ring is
+    full the oldest message is moved to the file at `path` (if given, up
+    to `max_file_size` bytes) or dropped. The file survives a reboot and
+    is replayed before the ring; completion callbacks are not kept there.
+    """
+
+    def __init__(self, size=32, path=None, max_file_size=65536):
+        self._slots = [None] * size
+        self._head = 0
+        self._count = 0
+        self._live = 0
+        self._retained = {}
+        self.dropped = 0
+
+        self._path = path
+        self.max_file_size = max_file_size
+        self._file_size = 0
+        self._file_pos = 0
+        self._file_count = 0
+        path is not None and self._open_spill()
+
+    def __len__(self):
+        return self._live + self._file_count
+
+    def put(self, topic, payload, retain=False, qos=0, callback=None):
+        if isinstance(payload, memoryview):
+            # reusable buffers change before the message is replayed
+            payload = bytes(payload)
+
+        slots = self._slots
+        if retain:
+            i = self._retained.get(topic)
+            if i is not None:
+                slots[i] = None
+                self._live -= 1
+
+        if self._count == len(slots):
+            self._evict()
+
+        i = (self._head + self._count) % len(slots)
+        slots[i] = (topic, payload, retain, qos, callback)
+        self._count += 1
+        self._live += 1
+        if retain:
+            self._retained[topic] = i
+
+    # Publish up to `limit` buffered messages in order with
+    # `publish(topic, payload, retain, qos, callback)`, stopping at the
+    # first one it refuses. Returns the number of messages sent.
+    def replay(self, publish, limit):
+        sent = 0
+        while sent < limit:
+            if self._file_count:
+                if not self._replay_spilled(publish):
+                    break
+            elif self._live:
+                entry = self._slots[self._head]
+                if entry is not None:
+                    if not publish(*entry):
+                        break
+                    self._live -= 1
+                    entry[2] and self._retained.pop(entry[0], None)
+                self._advance()
+                if entry is None:
+                    continue
+            else:
+                break
+            sent += 1
+        return sent
+
+    def clear(self):
+        self._slots = [None] * len(self._slots)
+        self._head = 0
+        self._count = 0
+        self._live = 0
+        self._retained = {}
+        self._file_count and self._remove_spill()
+
+    def _advance(self):
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % len(self._slots)
+        self._count -= 1
+
+    def _evict(self):
+        entry = self._slots[self._head]
+        if entry is not None:
+            self._live -= 1
+            if entry[2] and self._retained.get(entry[0]) == self._head:
+                del self._retained[entry[0]]
+            if self._path is None or not self._spill(entry):
+                self.dropped += 1
+        self._advance()
+
+    def _open_spill(self):
+        # messages spilled before a restart are replayed first
+        try:
+            self._file_size = os.stat(self._path)[6]
+        except OSError:
+            return
+        with open(self._path, "rb") as f:
+            pos = 0
+            while pos + _RECORD_SIZE <= self._file_size:
+                _, topic_len, payload_len = struct.unpack(_RECORD, f.read(_RECORD_SIZE))
+                pos += _RECORD_SIZE + topic_len + payload_len
+                f.seek(pos)
+                self._file_count += 1
+
+    def _spill(self, entry):
+        topic, payload, retain, qos, _ = entry
+        if isinstance(payload, str):
+            payload = payload.encode()
+        n = _RECORD_SIZE + len(topic) + len(payload)
+        if self._file_size + n > self.max_file_size:
+            return False
+        try:
+            with open(self._path, "ab") as f:
+                f.write(struct.pack(_RECORD, retain | qos << 1, len(topic), len(payload)))
+                f.write(topic)
+                f.write(payload)
+        except OSError:
+            return False
+        self._file_size += n
+        self._file_count += 1
+        return True
+
+    def _replay_spilled(self, publish):
+        with open(self._path, "rb") as f:
+            f.seek(self._file_pos)
+            flags, topic_len, payload_len = struct.unpack(_RECORD, f.read(_RECORD_SIZE))
+            topic = f.read(topic_len)
+            payload = f.read(payload_len)
+        retain = bool(flags & 1)
+        # a retained state still in the ring is newer than this one
+        if not (retain and topic in self._retained):
+            if not publish(topic, payload, retain, flags >> 1, None):
+                return False
+        self._file_pos += _RECORD_SIZE + topic_len + payload_len
+        self._file_count -= 1
+        self._file_count or self._remove_spill()
+        return True
+
+    def _remove_spill(self):
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+        self._file_size = 0
+        self._file_pos = 0
+        self._file_count = 0
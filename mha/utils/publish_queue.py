@@ -0,0 +1,43 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+
+class PublishQueue:
+    """Outgoing messages coalesced per topic, last value wins.
+
+    A newer payload replaces the unsent one for the same topic and keeps
+    its place in the queue. If any of the coalesced messages was retained
+    the one sent is retained too, so the broker's copy never goes stale,
+    and it goes out with the highest QoS requested.
+    """
+
+    def __init__(self):
+        self._topics = []
+        self._messages = {}
+
+    def __len__(self):
+        return len(self._topics)
+
+    def put(self, topic, payload, retain=False, qos=0):
+        if isinstance(payload, memoryview):
+            # reusable buffers change before the queue is flushed
+            payload = bytes(payload)
+
+        message = self._messages.get(topic)
+        if message is None:
+            self._topics.append(topic)
+            self._messages[topic] = [payload, retain, qos]
+        else:
+            message[0] = payload
+            message[1] = message[1] or retain
+            message[2] = max(message[2], qos)
+
+    def flush(self, publish):
+        topics = self._topics
+        messages = self._messages
+        self._topics = []
+        self._messages = {}
+        for topic in topics:
+            message = messages[topic]
+            publish(topic, message[0], message[1], message[2])
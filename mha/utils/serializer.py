@@ -13,12 +13,97 @@ class EntryType:
     FlagEntryType = 3
 
 
-class SerializerEntry:
-    def __init__(self, type, subtype, property, value) -> None:
-        self.type = type
-        self.subtype = subtype
-        self.property = property
-        self.value = value
+_JsonDataPrefix = constants.HASerializerJsonDataPrefix.encode("utf-8")
+_JsonDataSuffix = constants.HASerializerJsonDataSuffix.encode("utf-8")
+_JsonPropertyPrefix = constants.HASerializerJsonPropertyPrefix.encode("utf-8")
+_JsonPropertySuffix = constants.HASerializerJsonPropertySuffix.encode("utf-8")
+_JsonEscapeChar = constants.HASerializerJsonEscapeChar.encode("utf-8")
+_JsonPropertiesSeparator = constants.HASerializerJsonPropertiesSeparator.encode("utf-8")
+_JsonArrayPrefix = constants.HASerializerJsonArrayPrefix.encode("utf-8")
+_JsonArraySuffix = constants.HASerializerJsonArraySuffix.encode("utf-8")
+_JsonTrue = constants.HATrue.encode("utf-8")
+_JsonFalse = constants.HAFalse.encode("utf-8")
+_JsonUnderscore = constants.HASerializerUnderscore.encode("utf-8")
+
+
+class SerializerSizeCounter:
+    """Output stream that only counts the bytes written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+class SerializerCrc:
+    """Output stream that only computes the CRC-32 of the bytes written to it."""
+
+    def __init__(self):
+        from binascii import crc32
+
+        self._crc32 = crc32
+        self.crc = 0
+
+    def write(self, data):
+        self.crc = self._crc32(data, self.crc)
+
+
+class SerializerBuffer:
+    """Output stream that writes into a caller-supplied buffer."""
+
+    def __init__(self, buffer):
+        self._buffer = memoryview(buffer)
+        self.size = 0
+
+    def write(self, data):
+        end = self.size + len(data)
+        self._buffer[self.size:end] = data
+        self.size = end
+
+
+def _write_string(out, value):
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+
+    out.write(_JsonEscapeChar)
+    if value and (b'"' in value or b"\\" in value or min(value) < 0x20):
+        start = 0
+        for i in range(len(value)):
+            c = value[i]
+            if c == 0x22 or c == 0x5C or c < 0x20:
+                out.write(value[start:i])
+                out.write(b"\\" + bytes((c,)) if c >= 0x20 else ("\\u%04x" % c).encode("utf-8"))
+                start = i + 1
+        out.write(value[start:])
+    else:
+        out.write(value)
+    out.write(_JsonEscapeChar)
+
+
+def _write_value(out, value):
+    if isinstance(value, (str, bytes)):
+        _write_string(out, value)
+    elif value is True or value is False:
+        out.write(_JsonTrue if value else _JsonFalse)
+    elif isinstance(value, (list, tuple)):
+        out.write(_JsonArrayPrefix)
+        for i, item in enumerate(value):
+            i and out.write(_JsonPropertiesSeparator)
+            _write_value(out, item)
+        out.write(_JsonArraySuffix)
+    elif isinstance(value, dict):
+        out.write(_JsonDataPrefix)
+        first = True
+        for key, item in value.items():
+            first or out.write(_JsonPropertiesSeparator)
+            first = False
+            _write_string(out, key)
+            out.write(b":")
+            _write_value(out, item)
+        out.write(_JsonDataSuffix)
+    else:
+        out.write(str(value).encode("utf-8"))
 
 
 class HASerializer:
@@ -26,57 +111,90 @@ class HASerializer:
     WithAvailability = 2
     WithUniqueId = 3
 
+    __slots__ = ("_device_type", "_entries")
+
+    # entries are (type, property, value) tuples; a flag entry keeps the
+    # flag in place of the property
     def __init__(self, device_type):
         self._device_type = device_type
         self._entries = []
-        self._payload = {}
 
     def set_kv(self, key, value):
         if key is None or value is None:
             return
 
-        self._entries.append(SerializerEntry(EntryType.PropertyEntryType, None, key, value))
+        entries = self._entries
+        for i in range(len(entries)):
+            if entries[i][0] == EntryType.PropertyEntryType and entries[i][1] == key:
+                entries[i] = (EntryType.PropertyEntryType, key, value)
+                return
+
+        entries.append((EntryType.PropertyEntryType, key, value))
 
     def set_topic(self, topic):
-        self._entries.append(SerializerEntry(EntryType.TopicEntryType, None, topic, None))
+        self._entries.append((EntryType.TopicEntryType, topic, None))
 
     def set_flag(self, flag):
         if flag == self.WithDevice or flag == self.WithUniqueId:
-            self._entries.append(SerializerEntry(EntryType.FlagEntryType, flag, None, None))
+            self._entries.append((EntryType.FlagEntryType, flag, None))
         elif flag == self.WithAvailability:
-            mqtt = HAMqtt.instance()
-            is_shared_availability = mqtt.device.is_shared_availability_enabled()
-            is_availability_configured = self._device_type.is_availability_configured()
-            if is_shared_availability or is_availability_configured:
-                self._entries.append(
-                    SerializerEntry(
-                        EntryType.TopicEntryType,
-                        None,
-                        constants.HAAvailabilityTopic,
-                        mqtt.device.get_availability_topic() if is_shared_availability else None,
-                    )
-                )
-
-    def flush(self) -> bool:
+            device = self._device_type.get_device()
+            if device.is_shared_availability_enabled():
+                topic = device.get_availability_topic()
+            elif self._device_type.is_availability_configured():
+                topic = self._device_type.get_data_topic(constants.HAAvailabilityTopic)
+            else:
+                topic = None
+
+            # the connection's last will also takes down the devices behind it
+            last_will = HAMqtt.instance().get_availability_last_will()
+            if last_will is None or last_will == topic:
+                topic is not None and self._entries.append((EntryType.TopicEntryType, constants.HAAvailabilityTopic, topic))
+            elif topic is None:
+                self._entries.append((EntryType.TopicEntryType, constants.HAAvailabilityTopic, last_will))
+            else:
+                self.set_kv(constants.HAAvailabilityProperty, ({constants.HATopic: topic}, {constants.HATopic: last_will}))
+                self.set_kv(constants.HAAvailabilityModeProperty, constants.HAAvailabilityModeAll)
+
+    def calculate_size(self) -> int:
+        counter = SerializerSizeCounter()
+        if not self.flush(counter):
+            return 0
+        return counter.size
+
+    def flush(self, out) -> bool:
+        """Write the JSON payload to `out`, anything with a `write()` method."""
         mqtt = HAMqtt.instance()
-        if mqtt is None or (self._device_type and mqtt.device is None):
+        if mqtt is None or (self._device_type and self._device_type.get_device() is None):
             return False
-        self._flush_entry()
-        return self._payload
+
+        out.write(_JsonDataPrefix)
+        self._flush_entry(out)
+        out.write(_JsonDataSuffix)
+        return True
+
+    @staticmethod
+    def flush_value(out, value):
+        """Write `value` (str, bytes, bool, number, list, tuple or dict) as JSON to `out`."""
+        _write_value(out, value)
 
     @staticmethod
-    def generate_data_topic(object_id, topic):
+    def generate_data_topic(object_id, topic, device=None):
         mqtt = HAMqtt.instance()
-        if mqtt is None or mqtt.data_prefix is None or mqtt.device is None:
+        if mqtt is None or mqtt.data_prefix is None:
+            return None
+
+        device = device or mqtt.device
+        if device is None:
             return None
 
         l = [
             mqtt.data_prefix,
             constants.HASerializerSlash,
-            mqtt.device.get_unique_id(),
+            device.get_unique_id(),
             constants.HASerializerSlash,
         ]
-        object_id is None and l.extend([object_id, constants.HASerializerSlash])
+        object_id is not None and l.extend([object_id, constants.HASerializerSlash])
         l.append(topic)
 
         return "".join(l)
@@ -85,16 +203,24 @@ class HASerializer:
         if actualTopic is None:
             return False
 
-        expectedTopic = self.generate_data_topic(objectId, topic)
+        if self._device_type is not None and objectId == self._device_type.unique_id:
+            return actualTopic == self._device_type.get_data_topic(topic)
+
+        device = self._device_type.get_device() if self._device_type is not None else None
+        expectedTopic = self.generate_data_topic(objectId, topic, device)
         if expectedTopic is None:
             return False
 
         return actualTopic == expectedTopic.encode("utf-8")
 
     @staticmethod
-    def generate_config_topic(component, object_id):
+    def generate_config_topic(component, object_id, device=None):
         mqtt = HAMqtt.instance()
-        if mqtt is None or mqtt.data_prefix is None or mqtt.device is None:
+        if mqtt is None or mqtt.data_prefix is None:
+            return None
+
+        device = device or mqtt.device
+        if device is None:
             return None
 
         return "".join([
@@ -102,32 +228,41 @@ class HASerializer:
             constants.HASerializerSlash,
             component,
             constants.HASerializerSlash,
-            mqtt.device.get_unique_id(),
+            device.get_unique_id(),
             constants.HASerializerSlash,
             object_id,
             constants.HASerializerSlash,
             constants.HAConfigTopic,
         ])
 
-    def _flush_entry(self):
-        for entry in self._entries:
-            if entry.type == EntryType.PropertyEntryType:
-                self._payload[entry.property] = entry.value
-            elif entry.type == EntryType.TopicEntryType:
-                if entry.value is not None:
-                    self._payload[entry.property] = str(entry.value)
+    def _flush_entry(self, out):
+        first = True
+        for type, key, value in self._entries:
+            if type == EntryType.FlagEntryType:
+                device = self._device_type.get_device()
+                if device is None:
+                    continue
+                flag = key
+                key = constants.HADeviceProperty if flag == self.WithDevice else constants.HAUniqueIdProperty
+
+            first or out.write(_JsonPropertiesSeparator)
+            first = False
+            out.write(_JsonPropertyPrefix)
+            out.write(key.encode("utf-8"))
+            out.write(_JsonPropertySuffix)
+
+            if type == EntryType.PropertyEntryType:
+                _write_value(out, value)
+            elif type == EntryType.TopicEntryType:
+                if value is not None:
+                    _write_string(out, value)
                 else:
-                    self._payload[entry.property] = self.generate_data_topic(
-                        self._device_type.unique_id, entry.property
-                    )
-            elif entry.type == EntryType.FlagEntryType:
-                mqtt = HAMqtt.instance()
-                device = mqtt.device
-                if entry.subtype == self.WithDevice and device is not None:
-                    self._payload[constants.HADeviceProperty] = device.get_serializer().flush()
-                elif entry.subtype == self.WithUniqueId and device is not None:
-                    self._payload[constants.HAUniqueIdProperty] = (
-                        device.get_unique_id()
-                        + constants.HASerializerUnderscore
-                        + self._device_type.unique_id
-                    )
+                    _write_string(out, self._device_type.get_data_topic(key))
+            elif flag == self.WithDevice:
+                device.get_serializer().flush(out)
+            else:
+                out.write(_JsonEscapeChar)
+                out.write(device.get_unique_id().encode("utf-8"))
+                out.write(_JsonUnderscore)
+                out.write(self._device_type.unique_id.encode("utf-8"))
+                out.write(_JsonEscapeChar)
@@ -0,0 +1,23 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 lbuque
+#
+# SPDX-License-Identifier: MIT
+
+# Millisecond and microsecond ticks: MicroPython's time.ticks_* or a
+# CPython fallback.
+
+try:
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add
+except ImportError:
+    import time
+
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+    def ticks_us():
+        return int(time.monotonic() * 1000000)
+
+    def ticks_diff(ticks1, ticks2):
+        return ticks1 - ticks2
+
+    def ticks_add(ticks, delta):
+        return ticks + delta